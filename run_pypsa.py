@@ -2,7 +2,7 @@ import pypsa
 import pickle
 import argparse,logging
 from pathlib import Path
-import os, sys
+import os, sys, time
 import pandas as pd
 
 # note in GitHub action the cwd is /home/runner/work/table_pypsa/table_pypsa
@@ -21,8 +21,21 @@ if not cwd.parts[-1]=='table_pypsa' and 'table_pypsa' in os.listdir():
     # add path to table_pypsa to sys.path
     sys.path.append(str(cwd / 'table_pypsa'))
     
-from utilities.read_input import read_input_file_to_dict
-from utilities.utilities import skip_until_keyword, get_output_filename, stats_add_units, add_carrier_info
+from utilities.validate import check_case_file, report_problems
+from utilities.utilities import get_output_filename, stats_add_units, add_carrier_info
+from utilities.results_store import write_results_to_store
+from utilities.run_state import input_hashes, read_manifest, new_manifest, update_manifest, completed_stage, outputs_complete, \
+    output_paths, checkpoint_path, save_checkpoint, load_checkpoint
+from utilities.work_queue import enqueue_cases, run_worker, run_local_workers, queue_status, STALE_TIMEOUT
+from utilities.time_series_store import is_time_series_reference, is_time_series_store, time_series_exists, read_time_series, convert_time_series_file
+from utilities.excel_writer import write_excel_streaming
+from utilities.sensitivity import objective_sensitivities
+from utilities.mga import run_mga, BASIS_SOLVERS
+from utilities.aggregation import aggregate_components, count_removed_variables, disaggregate_network
+from utilities.pipeline import run_pipeline
+from utilities.result_views import result_views
+from utilities.pathway import read_pathway_periods, period_overrides, installed_capacities, update_carried, is_retired, \
+    carried_component, model_structure
 
 
 def scale_normalize_time_series(component_dict, scaling_factor=1.):
@@ -69,31 +82,18 @@ def divide_results_by_numeric_factor(df_dict, scaling_factor):
     return df_dict
 
 
-def process_time_series_file(ts_file, date_time_start, date_time_end):
+def process_time_series_file(ts_file, date_time_start, date_time_end, cache=None):
     """
-    Read in time series file and format as pandas dataframe and return dataframe if not empty.
+    Read in time series file or store and format as pandas dataframe and return dataframe if not empty.
+    Only the time period is read from a time series store.
+    cache: optional dictionary to reuse csv files parsed for earlier cases
     """
-    skiprows = skip_until_keyword(ts_file, 'BEGIN_DATA')
-
-    ts = pd.read_csv(ts_file, parse_dates=False, sep=",", skiprows=skiprows)
-    ts.columns = [x.lower() for x in ts.columns]
-    
-    # Assume first column is datetime unless 'hour' is present
-    if not 'hour' in ts.columns:
-        ts['date'] = pd.to_datetime(ts[ts.columns[0]])
-        ts.drop(columns=[ts.columns[0]], inplace=True)
-        # Drop raw demand if present
-        if 'raw demand (mw)' in ts.columns:
-            ts.drop(columns=['raw demand (mw)'], inplace=True)
+    if cache is not None and not is_time_series_store(ts_file):
+        if ts_file not in cache.setdefault('time series', {}):
+            cache['time series'][ts_file] = read_time_series(ts_file)
+        ts = cache['time series'][ts_file].loc[date_time_start: date_time_end]
     else:
-        # Date as 'day', 'month', 'year' and 'hour' columns
-        # This corresponds to the format of the time series files from MEM (developed by CLab)
-        ts['hour'] = ts['hour'] - 1  # convert MEM 1..24 to py 0..23
-        ts['date'] = pd.to_datetime(ts[['day', 'month', 'year', 'hour']])
-        ts.drop(columns=['day', 'month', 'year', 'hour'], inplace=True)
-
-
-    ts.set_index('date', inplace=True)
+        ts = read_time_series(ts_file, date_time_start, date_time_end)
 
     # Check if time series exists and covers the whole time period
     if ts.empty:
@@ -103,8 +103,6 @@ def process_time_series_file(ts_file, date_time_start, date_time_end):
     elif date_time_start not in ts.index or date_time_end not in ts.index:
         logging.warning("Time series doesn't cover the whole time period. Returning now.")
         return
-    else:
-        ts = ts.loc[date_time_start: date_time_end]
 
     return ts
 
@@ -120,9 +118,10 @@ def add_buses_to_network(n, component_list):
     return n
 
 
-def dicts_to_pypsa(case_dict, component_list, component_attr):
+def dicts_to_pypsa(case_dict, component_list, component_attr, cache=None):
     """
     Define PyPSA network and add components based on input dictionaries
+    cache: optional dictionary to reuse time series files parsed for earlier cases
     """
     # Define PyPSA network
     n = pypsa.Network(override_component_attrs=component_attr)
@@ -134,16 +133,16 @@ def dicts_to_pypsa(case_dict, component_list, component_attr):
         # for generators and loads, add time series to components
         for attr in component_dict:
             # Add time series to components
-            if isinstance(component_dict[attr], str) and ".csv" in component_dict[attr]:
+            if is_time_series_reference(component_dict[attr]):
                 logging.info("Reading time series file for {0} of {1}.".format(attr, component_dict["name"]))
                 factor = component_dict[attr].split("*")[0] if "*" in component_dict[attr] else 1
                 component_dict[attr] = component_dict[attr].split("*")[1] if "*" in component_dict[attr] else component_dict[attr]
                 ts_file = os.path.join(case_dict["input_path"],component_dict[attr])
-                if not os.path.exists(ts_file):
+                if not time_series_exists(ts_file):
                     logging.error("Time series file not found for {0} in path {1}. Exiting now.".format(component_dict[attr], ts_file))
                     sys.exit(1)
                 try:
-                    ts = process_time_series_file(ts_file, case_dict["datetime_start"], case_dict["datetime_end"])
+                    ts = process_time_series_file(ts_file, case_dict["datetime_start"], case_dict["datetime_end"], cache)
                 except Exception: 
                     logging.error("Didn't process time series file {0} accurately. Exiting now.".format(component_dict[attr]))
                     sys.exit(1)
@@ -183,31 +182,32 @@ def dicts_to_pypsa(case_dict, component_list, component_attr):
     return n
 
 
-def write_results_to_file(infile, outfile, component_input_list, df_dict):
+def write_results_to_file(infile, outfile, component_input_list, df_dict, streaming_excel=False):
     """
     Write results to excel file and pickle file
+    streaming_excel: write the excel file row by row in constant memory, splitting sheets that exceed the Excel row limit
     """
     # Write results to excel file
     # If input was read from output, change name
     if infile == outfile+".xlsx":
         outfile = outfile + "_rerun"
-    with pd.ExcelWriter(outfile+".xlsx") as writer:
-        # Copy infile to first sheet of output file
-        if infile.endswith('.xlsx'):
-            input_df = pd.read_excel(infile, sheet_name=0)
-        else:  # csv
-            input_df = pd.read_csv(infile)
-        # Column names
-        headers = ["PyPSA case input file"] + (len(input_df.columns)-1) * [""]
-        input_df.to_excel(writer, sheet_name="input file", index=False, header=headers)
-        # Write component list to excel file which includes the cost values
-        pd.DataFrame(component_input_list).to_excel(writer, index=False, sheet_name="component inputs")
-        # Write results to excel file
-        for results in df_dict:
-            if results == "case results":
-                df_dict[results].to_excel(writer, sheet_name=results, index=False)
-            else:
-                df_dict[results].to_excel(writer, sheet_name=results)
+    # Copy infile to first sheet of output file
+    if infile.endswith('.xlsx'):
+        input_df = pd.read_excel(infile, sheet_name=0)
+    else:  # csv
+        input_df = pd.read_csv(infile)
+    # Column names
+    headers = ["PyPSA case input file"] + (len(input_df.columns)-1) * [""]
+    # Sheets as (sheet name, dataframe, write index, header), the component list includes the cost values
+    sheets = [("input file", input_df, False, headers),
+              ("component inputs", pd.DataFrame(component_input_list), False, None)]
+    sheets += [(results, df_dict[results], results != "case results", None) for results in df_dict]
+    if streaming_excel:
+        write_excel_streaming(outfile+".xlsx", sheets)
+    else:
+        with pd.ExcelWriter(outfile+".xlsx") as writer:
+            for sheet_name, df, index, header in sheets:
+                df.to_excel(writer, sheet_name=sheet_name, index=index, header=header if header is not None else True)
 
     # Write results to pickle file
     with open(outfile+".pickle", 'wb') as f:
@@ -222,6 +222,9 @@ def postprocess_results(n, case_dict):
     """
     Postprocess results and collect in dataframes
     """
+    # Split results of aggregated components onto the original components
+    n = disaggregate_network(n)
+
     # Collect generators_t["p_max_pu"] and loads_t["p_set"] in one input dataframe, renaming columns to include "series" or "load"
     time_inputs_df = n.generators_t["p_max_pu"]
     time_inputs_df = time_inputs_df.rename(columns=dict(zip(n.generators_t["p_max_pu"].columns.to_list(),
@@ -281,6 +284,19 @@ def postprocess_results(n, case_dict):
     # Divide results by scaling factor
     df_dict = divide_results_by_numeric_factor(df_dict, case_dict["numerics_scaling"])
 
+    # Sensitivities of the objective are already in input units
+    if 'sensitivities' in n.meta:
+        df_dict['sensitivities'] = n.meta['sensitivities']
+    # Capacities of the near-optimal alternatives, also in input units
+    if 'mga' in n.meta:
+        df_dict['mga results'] = n.meta['mga']
+    # Duration curves, monthly and seasonal energy and diurnal profiles, computed in input units
+    if case_dict.get('result_views'):
+        df_dict.update(result_views(n, case_dict))
+    # Leave out the full resolution time series when only the aggregated views are needed
+    if case_dict.get('drop_time_results'):
+        del df_dict['time inputs'], df_dict['time results']
+
     return df_dict
 
 
@@ -290,8 +306,8 @@ def add_bicharger_constraint(m, n):
     """
     # Add bi-directional charging constraint if bicharger in name of component
 
-    # Filter links with 'bicharger' in their name
-    bicharger_links = [link for link in n.links.index if 'bicharger' in link]
+    # Filter extendable links with 'bicharger' in their name, fixed capacities (e.g. carried from an earlier period) have no sizing
+    bicharger_links = [link for link in n.links.index[n.links.p_nom_extendable] if 'bicharger' in link]
 
     # Create a dictionary to store matching charger-discharger pairs
     bicharger_pairs = {}
@@ -322,32 +338,62 @@ def add_bicharger_constraint(m, n):
 
     return m
 
-def build_network(infile):
-    """ infile: string path for .xlsx or .csv case file """
+def read_case(infile, overrides=None, cache=None):
+    """
+    Read in case input file and translate to dictionaries, validate all inputs before building the network.
+    overrides: optional dictionary of case data values replacing those in the case file
+    cache: optional dictionary to reuse cost tables across cases
+    Exit if the case file is not valid.
+    """
+    inputs, problems = check_case_file(infile, overrides=overrides, cache=cache)
+    if problems:
+        report_problems(infile, problems)
+        logging.error("Case file {0} is not valid. Exiting now.".format(infile))
+        sys.exit(1)
+    return inputs
+
+
+def build_network(infile, inputs=None, cache=None):
+    """ infile: string path for .xlsx or .csv case file
+        inputs: optional result of read_case for infile, to avoid reading the case file again
+        cache: optional dictionary to reuse time series files across cases """
     
     # Read in case input file and translate to dictionaries
-    case_dict, component_list, component_attributes = read_input_file_to_dict(infile)
+    case_dict, component_list, component_attributes = inputs if inputs is not None else read_case(infile)
+
+    # Merge equivalent components to reduce the size of the model, the original component_list is kept for the results
+    if case_dict.get('aggregate_components'):
+        reduced_list, aggregation = aggregate_components(component_list)
+    else:
+        reduced_list, aggregation = component_list, {}
 
     # Define PyPSA network
-    network = dicts_to_pypsa(case_dict, component_list, component_attributes)
+    network = dicts_to_pypsa(case_dict, reduced_list, component_attributes, cache)
+
+    if aggregation:
+        network.meta['aggregation'] = aggregation
+        logging.warning("Aggregated {0} components into {1}, removing {2} optimization variables.".format(
+            sum(len(info['members']) for info in aggregation.values()), len(aggregation),
+            count_removed_variables(aggregation, len(network.snapshots))))
 
     return network, case_dict, component_list, component_attributes
 
 
-def run_pypsa(network, case_dict):
+def run_pypsa(network, case_dict, solve_options=None):
 
-    # Solve the linear optimization power flow with Gurobi
+    # Solve the linear optimization power flow with Gurobi, solve_options are passed to the solver (e.g. warmstart_fn, basis_fn)
     model = network.optimize.create_model()
     model = add_bicharger_constraint(model, network)
-    network.optimize.solve_model(solver_name=case_dict['solver'])
+    status, condition = network.optimize.solve_model(solver_name=case_dict['solver'], **(solve_options or {}))
 
     # Check if optimization was successful
     if not hasattr(network, 'objective'):
         logging.warning("Optimization was not successful! Returning now.")
-        return
+    return status, condition
 
 
-def write_result(network, case_dict, component_list, infile, outfile_suffix=""):
+def write_result(network, case_dict, component_list, infile, outfile_suffix="", results_store=None, store_time_resolution=None,
+                 streaming_excel=False):
 
     # Postprocess results and write to excel, pickle
     output_df_dict = postprocess_results(network, case_dict)
@@ -355,20 +401,300 @@ def write_result(network, case_dict, component_list, infile, outfile_suffix=""):
     # Get output path and filename
     output_file = get_output_filename(case_dict) + outfile_suffix
     # Write results to file
-    write_results_to_file(infile, output_file, component_list, output_df_dict)
+    write_results_to_file(infile, output_file, component_list, output_df_dict, streaming_excel=streaming_excel)
+
+    # Append results to shared results store for querying across runs
+    if results_store is not None:
+        write_results_to_store(results_store, case_dict, component_list, output_df_dict, infile=infile,
+                               time_resolution=store_time_resolution)
 
     # Save network to .nc file
     # network.export_to_netcdf(output_file + ".nc")
 
 
+def build_case(infile, inputs, resume=False, cache=None):
+    """
+    First stage of a case: build the network, or load it from the checkpoint of a resumed case.
+    inputs: result of read_case for infile
+    Return dictionary with the state of the case for solve_case and write_case, with 'done' set if the
+    case is skipped because its results are complete and its inputs did not change.
+    """
+    case_dict, component_list, _ = inputs
+    hashes = input_hashes(infile, case_dict, component_list)
+    previous_manifest = read_manifest(case_dict) if resume else None
+    stage = completed_stage(previous_manifest, hashes)
+    if stage == 'written' and outputs_complete(case_dict):
+        logging.warning("Skipping case file {0}, results are complete and inputs did not change.".format(infile))
+        return {'infile': infile, 'case_dict': case_dict, 'manifest': previous_manifest, 'done': True}
+
+    manifest = new_manifest(infile, hashes)
+    case = {'infile': infile, 'case_dict': case_dict, 'manifest': manifest, 'done': False, 'solved': False}
+    try:
+        # Also redo postprocessing of written cases from their checkpoint, e.g. if the results were removed
+        if stage in ('solved', 'written') and os.path.exists(checkpoint_path(case_dict)):
+            logging.warning("Resuming case file {0} from checkpoint of the solved network.".format(infile))
+            case['manifest'] = previous_manifest
+            case['network'], case['case_dict'], case['component_list'] = load_checkpoint(case_dict)
+            case['solved'] = True
+        else:
+            start_time = time.time()
+            case['network'], case['case_dict'], case['component_list'], _ = build_network(infile, inputs, cache)
+            manifest['timings']['build'] = time.time() - start_time
+            update_manifest(case_dict, manifest, stage='built')
+    except (Exception, SystemExit) as e:
+        update_manifest(case_dict, case['manifest'], status='failed', error=repr(e))
+        raise
+    return case
+
+
+def solve_case(case, checkpoint=False, solve_options=None):
+    """
+    Second stage of a case: solve the network of build_case, followed by sensitivities and alternatives
+    Return the state of the case, with 'done' set if the optimization was not successful.
+    """
+    if case['done'] or case['solved']:
+        return case
+    network, case_dict, manifest = case['network'], case['case_dict'], case['manifest']
+    if case_dict.get('mga_directions') and case_dict['solver'] in BASIS_SOLVERS:
+        # Basis of the optimal solve for the warm start of the first MGA direction
+        solve_options = dict(solve_options or {})
+        solve_options.setdefault('basis_fn', get_output_filename(case_dict) + '.bas')
+    try:
+        start_time = time.time()
+        status, condition = run_pypsa(network, case_dict, solve_options)
+        manifest['timings']['solve'] = time.time() - start_time
+        update_manifest(case_dict, manifest, solver_status=status, termination_condition=condition)
+        if status != 'ok':
+            update_manifest(case_dict, manifest, status='failed', error="Optimization was not successful")
+            case['done'] = True
+            return case
+        # Optimal capacities of the original components, carried to the next period of a pathway
+        update_manifest(case_dict, manifest, capacities=installed_capacities(disaggregate_network(network)))
+
+        # Sensitivities of the objective from the duals of the solved model, kept with the network for the results
+        if case_dict.get('sensitivity'):
+            start_time = time.time()
+            network.meta['sensitivities'] = objective_sensitivities(network, case_dict)
+            manifest['timings']['sensitivity'] = time.time() - start_time
+
+        # Near-optimal alternatives, solved with the same model after the sensitivities are read from it
+        if case_dict.get('mga_directions'):
+            start_time = time.time()
+            network.meta['mga'] = run_mga(network, case_dict, basis_fn=(solve_options or {}).get('basis_fn'))
+            manifest['timings']['mga'] = time.time() - start_time
+
+        checkpoint_file = save_checkpoint(network, case_dict, case['component_list']) if checkpoint else None
+        update_manifest(case_dict, manifest, stage='solved', checkpoint=checkpoint_file)
+    except (Exception, SystemExit) as e:
+        update_manifest(case_dict, manifest, status='failed', error=repr(e))
+        raise
+    case['solved'] = True
+    return case
+
+
+def write_case(case, results_store=None, store_time_resolution=None, streaming_excel=False):
+    """
+    Last stage of a case: postprocess and write the results of the solved network
+    Return the manifest of the case.
+    """
+    if case['done']:
+        return case['manifest']
+    case_dict, manifest = case['case_dict'], case['manifest']
+    try:
+        start_time = time.time()
+        write_result(case['network'], case_dict, case['component_list'], case['infile'], results_store=results_store,
+                     store_time_resolution=store_time_resolution, streaming_excel=streaming_excel)
+        manifest['timings']['write'] = time.time() - start_time
+        update_manifest(case_dict, manifest, stage='written', status='complete', error=None, outputs=output_paths(case_dict))
+    except (Exception, SystemExit) as e:
+        update_manifest(case_dict, manifest, status='failed', error=repr(e))
+        raise
+    return manifest
+
+
+def run_case(infile, resume=False, checkpoint=False, results_store=None, store_time_resolution=None, streaming_excel=False,
+             inputs=None, cache=None, solve_options=None):
+    """
+    Build, solve and write results of one case file, recording the completed stages in the manifest of the case.
+    With resume, a case whose results are complete and whose inputs did not change is skipped,
+    and a case with a checkpoint of its solved network is only postprocessed again.
+    A case file with pathway_periods is run as a pathway with run_pathway.
+    inputs: optional result of read_case for infile, cache and solve_options are passed to build_network and run_pypsa
+    Return the manifest of the case.
+    """
+    if inputs is None:
+        inputs = read_case(infile, cache=cache)
+        if inputs[0].get('pathway_periods'):
+            return run_pathway(infile, inputs[0], resume=resume, checkpoint=checkpoint, results_store=results_store,
+                               store_time_resolution=store_time_resolution, streaming_excel=streaming_excel)
+    case = build_case(infile, inputs, resume=resume, cache=cache)
+    case = solve_case(case, checkpoint=checkpoint, solve_options=solve_options)
+    return write_case(case, results_store=results_store, store_time_resolution=store_time_resolution,
+                      streaming_excel=streaming_excel)
+
+
+def run_pathway(infile, case_dict, **run_options):
+    """
+    Run the periods of the pathway_periods file of a case file in order as separate cases.
+    Capacities built in a period are added to the following periods with fixed capacity until their lifetime has
+    passed. Cost tables and time series files are read once for all periods, and every solve is warm started from
+    the basis of the previous period with the same components and time window where the solver supports it.
+    Return dictionary with the status of the pathway and the manifests of the periods.
+    """
+    cache = {}
+    carried = []
+    warmstart_fn = None
+    previous_structure = None
+    manifests = {}
+    periods = read_pathway_periods(case_dict)
+    for year, overrides in periods:
+        overrides = period_overrides(case_dict, year, overrides)
+        period_dict, component_list, component_attributes = read_case(infile, overrides=overrides, cache=cache)
+
+        # Add the capacities of earlier periods that are still within their lifetime
+        templates = {(component_dict['component'], component_dict['name']): component_dict for component_dict in component_list}
+        retired = [entry for entry in carried if is_retired(entry, year)]
+        carried = [entry for entry in carried if not is_retired(entry, year)]
+        for entry in retired:
+            logging.warning("Period {0}: {1} {2} built in {3} is retired.".format(year, entry['component'], entry['name'], entry['build_year']))
+        for entry in carried:
+            template = templates.get((entry['component'], entry['name']))
+            if template is None:
+                logging.warning("Period {0}: {1} {2} built in {3} is not in the case file anymore and is not carried.".format(
+                    year, entry['component'], entry['name'], entry['build_year']))
+                continue
+            component_list.append(carried_component(template, entry, period_dict['nyears']))
+
+        solve_options = None
+        if period_dict['solver'] in ['highs', 'gurobi']:
+            basis_fn = get_output_filename(period_dict) + '.bas'
+            solve_options = {'basis_fn': basis_fn}
+            # The basis only fits the model of a period with the same components and number of snapshots
+            structure = model_structure(period_dict, component_list)
+            if warmstart_fn is not None and os.path.exists(warmstart_fn) and structure == previous_structure:
+                solve_options['warmstart_fn'] = warmstart_fn
+            warmstart_fn, previous_structure = basis_fn, structure
+
+        logging.warning("Running pathway period {0} of case file {1}.".format(year, infile))
+        manifest = run_case(infile, inputs=(period_dict, component_list, component_attributes), cache=cache,
+                            solve_options=solve_options, **run_options)
+        manifests[year] = manifest
+        if manifest['status'] == 'failed' or not manifest.get('capacities'):
+            logging.error("Pathway period {0} of case file {1} failed, stopping the pathway.".format(year, infile))
+            break
+        carried = update_carried(carried, manifest['capacities'], year, period_dict['nyears'])
+    failed = len(manifests) < len(periods) or any(m['status'] == 'failed' for m in manifests.values())
+    return {'status': 'failed' if failed else 'complete', 'periods': manifests}
+
+
+def run_cases_pipelined(input_files, resume=False, checkpoint=False, results_store=None, store_time_resolution=None,
+                        streaming_excel=False, queue_size=1):
+    """
+    Run case files with overlapping stages: while one case is solved, the next case is read and built and
+    the results of the previous case are written, each stage in its own thread.
+    A pathway case file is run completely in the solve stage, as its periods depend on each other.
+    Return the list of results of run_pipeline, with the manifest of each case as result of the last stage.
+    """
+    def build_stage(infile):
+        inputs = read_case(infile)
+        if inputs[0].get('pathway_periods'):
+            return {'infile': infile, 'pathway': inputs[0]}
+        return build_case(infile, inputs, resume=resume)
+
+    def solve_stage(case):
+        if 'pathway' in case:
+            manifest = run_pathway(case['infile'], case['pathway'], resume=resume, checkpoint=checkpoint, results_store=results_store,
+                                   store_time_resolution=store_time_resolution, streaming_excel=streaming_excel)
+            return {'done': True, 'manifest': manifest}
+        return solve_case(case, checkpoint=checkpoint)
+
+    def write_stage(case):
+        return write_case(case, results_store=results_store, store_time_resolution=store_time_resolution,
+                          streaming_excel=streaming_excel)
+
+    return run_pipeline(input_files, [('build', build_stage), ('solve', solve_stage), ('write', write_stage)],
+                        queue_size=queue_size)
+
+
 if __name__ == "__main__":
     # Parse the input file as command line argument
     parser = argparse.ArgumentParser()
-    parser.add_argument('-f', '--filename', help="Input case file (xlsx or csv)", required=True)
+    parser.add_argument('-f', '--filename', nargs='+', help="Input case file(s) (xlsx or csv)")
+    parser.add_argument('--convert-time-series', nargs='+', metavar='CSV', help="Convert time series csv files to memory-mapped time series stores (<name>.tsstore) next to them and exit")
+    parser.add_argument('--check', action='store_true', help="Only validate the case file and report all problems, without building or solving the network")
+    parser.add_argument('--resume', action='store_true', help="Skip cases whose results are complete and whose inputs did not change, rerun failed or missing ones")
+    parser.add_argument('--checkpoint', action='store_true', help="Save the solved network, so that a resumed run can redo postprocessing without solving")
+    parser.add_argument('--results-store', help="Append results to a shared results store: SQLite file (.sqlite, .db) or Parquet dataset directory")
+    parser.add_argument('--store-time-resolution', help="Also store time results downsampled to this pandas frequency (e.g. 'D', 'MS')")
+    parser.add_argument('--streaming-excel', action='store_true', help="Write the results workbook row by row in constant memory, continuing sheets beyond the Excel row limit on numbered sheets")
+    parser.add_argument('--pipeline', action='store_true', help="Overlap reading and building the next case and writing the results of the previous case with solving the current case")
+    parser.add_argument('--queue-size', type=int, default=1, help="With --pipeline, number of cases waiting between two stages (default %(default)s)")
+    parser.add_argument('--enqueue', metavar='QUEUE_DIR', help="Put the case files into a work queue directory on a shared filesystem instead of running them")
+    parser.add_argument('--worker', metavar='QUEUE_DIR', help="Run cases from a work queue directory until it is empty")
+    parser.add_argument('--max-jobs', type=int, default=1, help="Number of cases a worker runs at the same time (default 1)")
+    parser.add_argument('--stale-timeout', type=float, default=STALE_TIMEOUT, help="Seconds after which a case claimed by a worker without heartbeat is run again (default %(default)s)")
+    parser.add_argument('--local-workers', type=int, help="With --enqueue, run this many workers on this machine until the queue is empty")
     args = parser.parse_args()
-    input_file = args.filename
+    if args.convert_time_series:
+        for ts_file in args.convert_time_series:
+            print("{0} -> {1}".format(ts_file, convert_time_series_file(ts_file)))
+        sys.exit(0)
+    if not args.filename and not args.worker:
+        parser.error("the following arguments are required: -f/--filename")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    run_options = {'resume': args.resume, 'checkpoint': args.checkpoint, 'results_store': args.results_store,
+                   'store_time_resolution': args.store_time_resolution, 'streaming_excel': args.streaming_excel}
+
+    # Validate case files only
+    if args.check:
+        n_problems = 0
+        for input_file in args.filename:
+            _, problems = check_case_file(input_file)
+            report_problems(input_file, problems)
+            print("{0}: {1}".format(input_file, "{0} problem(s) found".format(len(problems)) if problems else "OK"))
+            n_problems += len(problems)
+        sys.exit(1 if n_problems else 0)
     
-    # Run PyPSA
-    n, c_dict, comp_list, comp_attrs = build_network(input_file)
-    run_pypsa(n, c_dict)
-    write_result(n, c_dict, comp_list, input_file)
+    # Distribute cases through a file-based work queue
+    if args.enqueue:
+        enqueue_cases(args.enqueue, args.filename, run_options)
+        if args.local_workers:
+            status = run_local_workers(args.enqueue, run_case, n_workers=args.local_workers, max_jobs=args.max_jobs,
+                                       stale_timeout=args.stale_timeout)
+            print("Work queue {0}: {1}".format(args.enqueue, status))
+            sys.exit(1 if status['failed'] else 0)
+        sys.exit(0)
+    if args.worker:
+        run_worker(args.worker, run_case, max_jobs=args.max_jobs, stale_timeout=args.stale_timeout)
+        print("Work queue {0}: {1}".format(args.worker, queue_status(args.worker)))
+        sys.exit(0)
+
+    # Run the stages of consecutive cases at the same time, failures are reported per case
+    if args.pipeline:
+        results = run_cases_pipelined(args.filename, queue_size=args.queue_size, **run_options)
+        failed = [result['case'] for result in results if result['status'] == 'failed' or result['result']['status'] == 'failed']
+        for result in results:
+            logging.warning("Case file {0}: {1}{2}, stage times {3}".format(
+                result['case'], 'failed' if result['case'] in failed else 'complete',
+                ' in stage {0}: {1}'.format(result['stage'], result['error']) if result['error'] else '',
+                ', '.join('{0} {1:.1f} s'.format(stage, seconds) for stage, seconds in result['timings'].items())))
+        if failed:
+            logging.error("{0} of {1} case file(s) failed: {2}".format(len(failed), len(args.filename), ", ".join(failed)))
+            sys.exit(1)
+        sys.exit(0)
+
+    # Run PyPSA for every case file, continue with the next case if one fails
+    failed = []
+    for input_file in args.filename:
+        try:
+            case_manifest = run_case(input_file, **run_options)
+            if case_manifest['status'] == 'failed':
+                failed.append(input_file)
+        except (Exception, SystemExit) as e:
+            # Input errors exit with sys.exit, show traceback only for unexpected errors
+            logging.error("Case file {0} failed: {1!r}".format(input_file, e), exc_info=not isinstance(e, SystemExit))
+            failed.append(input_file)
+    if failed:
+        logging.error("{0} of {1} case file(s) failed: {2}".format(len(failed), len(args.filename), ", ".join(failed)))
+        sys.exit(1)
@@ -0,0 +1,10 @@
+"""
+Configuration of the unit tests in the test directory, run from the table_pypsa directory with
+    python -m pytest test
+"""
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Scripts of the check_output action and the regression harness, not unit tests
+collect_ignore = ['test_compare_output.py', 'regression.py']
@@ -0,0 +1,229 @@
+"""
+Regression harness: run all case files of a directory in parallel and compare their results to golden snapshots
+
+Every case is run with an open-source solver (HiGHS by default) into a temporary output directory. Its
+'case results', 'component results' and 'time results' are compared to the Parquet files in
+test/golden/<case file name>/ with the absolute and relative tolerances of test/regression_tolerances.json:
+a value matches if |result - golden| <= abs + rel * |golden|. The wall time of every case is reported next to
+the wall time recorded with the golden snapshot.
+
+Run from the table_pypsa directory:
+    python test/regression.py --costs-path test/regression_costs.csv            compare all cases in test/
+    python test/regression.py --costs-path test/regression_costs.csv --update   store new golden snapshots
+    python test/regression.py test/test_case.xlsx --max-slowdown 2
+"""
+import os, sys, json, glob, time, fnmatch, argparse, tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TEST_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from run_pypsa import read_case, run_case
+from utilities.read_input import read_pypsa_input_file
+from utilities.utilities import find_first_row_with_keyword
+
+
+GOLDEN_DIR = os.path.join(TEST_DIR, 'golden')
+TOLERANCES_FILE = os.path.join(TEST_DIR, 'regression_tolerances.json')
+COMPARED_SHEETS = ['case results', 'component results', 'time results']
+CASE_EXTENSIONS = ['.xlsx', '.csv']
+
+
+def is_case_file(path):
+    """
+    Return True if path is a case file: a csv or xlsx file with case data and component data that is not
+    a results workbook (which contains a copy of its case file)
+    """
+    if os.path.splitext(path)[1] not in CASE_EXTENSIONS:
+        return False
+    if path.endswith('.xlsx'):
+        with pd.ExcelFile(path) as workbook:
+            if 'time results' in workbook.sheet_names:
+                return False
+    try:
+        worksheet = read_pypsa_input_file(path)
+        return find_first_row_with_keyword(worksheet, 'case_data') >= 0 and \
+            find_first_row_with_keyword(worksheet, 'component_data') >= 0
+    except Exception:
+        # e.g. time series files
+        return False
+
+
+def find_case_files(paths):
+    """
+    Return sorted list of the case files in the given files and directories
+    """
+    case_files = []
+    for path in paths:
+        candidates = sorted(glob.glob(os.path.join(path, '*'))) if os.path.isdir(path) else [path]
+        case_files += [candidate for candidate in candidates if is_case_file(candidate)]
+    return case_files
+
+
+def case_key(case_file):
+    """
+    Return the name of the golden snapshot directory of a case file
+    """
+    return os.path.basename(case_file).replace('.', '_')
+
+
+def sheet_file(sheet_name):
+    """
+    Return the Parquet file name of a results sheet
+    """
+    return sheet_name.replace(' ', '_') + '.parquet'
+
+
+def run_regression_case(case_file, output_path, overrides):
+    """
+    Process pool worker: run one case into output_path and return (results dataframes by sheet, wall time, timings)
+    """
+    overrides = dict(overrides, output_path=output_path, case_name=case_key(case_file))
+    start_time = time.time()
+    inputs = read_case(case_file, overrides=overrides)
+    manifest = run_case(case_file, inputs=inputs)
+    wall_time = time.time() - start_time
+    if manifest['status'] != 'complete':
+        raise RuntimeError('Case did not complete: {0}'.format(manifest['error']))
+    pickle_file = [path for path in manifest['outputs'] if path.endswith('.pickle')][0]
+    df_dict = pd.read_pickle(pickle_file)
+    return {sheet: df_dict[sheet] for sheet in COMPARED_SHEETS if sheet in df_dict}, wall_time, manifest['timings']
+
+
+def read_tolerances():
+    """
+    Return dictionary with the default tolerances and the tolerances by column name pattern
+    """
+    with open(TOLERANCES_FILE) as f:
+        return json.load(f)
+
+
+def column_tolerance(tolerances, column):
+    """
+    Return (abs, rel) tolerance of a column, from the first matching pattern or the default
+    """
+    for pattern, tolerance in tolerances.get('columns', {}).items():
+        if fnmatch.fnmatch(str(column), pattern):
+            return tolerance['abs'], tolerance['rel']
+    return tolerances['default']['abs'], tolerances['default']['rel']
+
+
+def compare_sheet(result, golden, tolerances):
+    """
+    Return list of differences between a results dataframe and its golden snapshot
+    """
+    if not result.index.equals(golden.index):
+        return ['index differs from golden: {0} rows, golden {1} rows'.format(len(result), len(golden))]
+    differences = []
+    missing = [col for col in golden.columns if col not in result.columns]
+    extra = [col for col in result.columns if col not in golden.columns]
+    if missing or extra:
+        differences.append('columns missing {0}, not in golden {1}'.format(missing, extra))
+    for col in golden.columns.intersection(result.columns, sort=False):
+        expected, actual = golden[col], result[col]
+        if pd.api.types.is_numeric_dtype(expected.dtype) and pd.api.types.is_numeric_dtype(actual.dtype):
+            abs_tol, rel_tol = column_tolerance(tolerances, col)
+            expected_values = expected.to_numpy(dtype=float)
+            actual_values = actual.to_numpy(dtype=float)
+            # NaN and infinite values have to match exactly
+            same = (actual_values == expected_values) | (np.isnan(actual_values) & np.isnan(expected_values))
+            deviation = np.zeros(len(same))
+            deviation[~same] = np.abs(actual_values[~same] - expected_values[~same])
+            failed = ~same & ~(deviation <= abs_tol + rel_tol * np.abs(expected_values))
+            if failed.any():
+                differences.append('{0}: {1} value(s) outside abs {2} / rel {3}, max deviation {4:.6g}'.format(
+                    col, int(failed.sum()), abs_tol, rel_tol, np.nanmax(np.where(failed, deviation, np.nan))))
+        elif not expected.astype(str).equals(actual.astype(str)):
+            differences.append('{0}: values differ'.format(col))
+    return differences
+
+
+def write_golden(case_file, results, wall_time, timings):
+    """
+    Store the results of a case as its golden snapshot
+    """
+    golden_path = os.path.join(GOLDEN_DIR, case_key(case_file))
+    os.makedirs(golden_path, exist_ok=True)
+    for sheet, df in results.items():
+        df.to_parquet(os.path.join(golden_path, sheet_file(sheet)))
+    with open(os.path.join(golden_path, 'meta.json'), 'w') as f:
+        json.dump({'case_file': os.path.relpath(case_file, REPO_DIR), 'wall_time': wall_time, 'timings': timings}, f, indent=2)
+
+
+def compare_golden(case_file, results, tolerances):
+    """
+    Return (list of differences, golden wall time or None) of the results of a case against its golden snapshot
+    """
+    golden_path = os.path.join(GOLDEN_DIR, case_key(case_file))
+    if not os.path.exists(os.path.join(golden_path, 'meta.json')):
+        return ['no golden snapshot, run with --update to create it'], None
+    with open(os.path.join(golden_path, 'meta.json')) as f:
+        meta = json.load(f)
+    differences = []
+    for sheet in COMPARED_SHEETS:
+        path = os.path.join(golden_path, sheet_file(sheet))
+        if not os.path.exists(path):
+            continue
+        if sheet not in results:
+            differences.append('{0}: sheet missing'.format(sheet))
+            continue
+        differences += ['{0}: {1}'.format(sheet, difference)
+                        for difference in compare_sheet(results[sheet], pd.read_parquet(path), tolerances)]
+    return differences, meta['wall_time']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run case files in parallel and compare their results to golden snapshots")
+    parser.add_argument('paths', nargs='*', default=[TEST_DIR], help="Case files or directories with case files (default: test/)")
+    parser.add_argument('--update', action='store_true', help="Store the results as new golden snapshots instead of comparing")
+    parser.add_argument('--solver', default='highs', help="Solver used for all cases (default %(default)s)")
+    parser.add_argument('--costs-path', help="Replace costs_path of all cases, e.g. with a local copy of the cost database")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help="Number of cases run at the same time")
+    parser.add_argument('--max-slowdown', type=float, help="Fail cases whose wall time exceeds this factor times the golden wall time")
+    args = parser.parse_args()
+
+    # Case files refer to their time series relative to the table_pypsa directory
+    os.chdir(REPO_DIR)
+    case_files = find_case_files(args.paths)
+    if not case_files:
+        parser.error("no case files found in {0}".format(', '.join(args.paths)))
+    overrides = {'solver': args.solver, 'logging_level': 'error'}
+    if args.costs_path:
+        overrides['costs_path'] = args.costs_path
+    tolerances = read_tolerances()
+
+    failed = []
+    with tempfile.TemporaryDirectory() as output_path, ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(case_files)))) as executor:
+        futures = {case_file: executor.submit(run_regression_case, case_file, output_path, overrides) for case_file in case_files}
+        print('{0:<60} {1:>10} {2:>10}  {3}'.format('case', 'time [s]', 'golden [s]', 'result'))
+        for case_file, future in futures.items():
+            try:
+                results, wall_time, timings = future.result()
+            except (Exception, SystemExit) as e:
+                print('{0:<60} {1:>10} {2:>10}  FAILED to run: {3!r}'.format(case_file, '-', '-', e))
+                failed.append(case_file)
+                continue
+            if args.update:
+                write_golden(case_file, results, wall_time, timings)
+                print('{0:<60} {1:>10.1f} {2:>10}  golden snapshot updated'.format(case_file, wall_time, '-'))
+                continue
+            differences, golden_time = compare_golden(case_file, results, tolerances)
+            if args.max_slowdown and golden_time and wall_time > args.max_slowdown * golden_time:
+                differences.append('wall time {0:.1f} s exceeds {1} x golden wall time {2:.1f} s'.format(wall_time, args.max_slowdown, golden_time))
+            print('{0:<60} {1:>10.1f} {2:>10}  {3}'.format(case_file, wall_time, '{0:.1f}'.format(golden_time) if golden_time else '-',
+                                                           'OK' if not differences else 'FAILED'))
+            for difference in differences:
+                print('    ' + difference)
+            if differences:
+                failed.append(case_file)
+
+    if failed:
+        print('{0} of {1} case(s) failed'.format(len(failed), len(case_files)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
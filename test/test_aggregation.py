@@ -0,0 +1,55 @@
+"""
+Tests of the aggregation of components with fixed capacity and the disaggregation of their results
+"""
+import numpy as np
+import pandas as pd
+import pypsa
+import pytest
+from utilities.aggregation import aggregate_components, disaggregate_network
+
+
+def fixed_generators():
+    """
+    Return component dictionaries of two fixed solar generators with different p_max_pu factors and a load
+    """
+    return [{'component': 'Generator', 'name': 'solar north', 'carrier': 'solar', 'bus': 'bus', 'p_nom': 100.,
+             'p_max_pu': 'solar.csv', 'marginal_cost': 0.},
+            {'component': 'Generator', 'name': 'solar south', 'carrier': 'solar', 'bus': 'bus', 'p_nom': 300.,
+             'p_max_pu': '0.5*solar.csv', 'marginal_cost': 0.},
+            {'component': 'Load', 'name': 'load', 'bus': 'bus', 'p_set': 'demand.csv'}]
+
+
+def test_fixed_generators_are_aggregated_weighted_by_capacity():
+    reduced_list, aggregation = aggregate_components(fixed_generators())
+    assert [component_dict['name'] for component_dict in reduced_list] == ['solar north aggregated', 'load']
+    aggregated = reduced_list[0]
+    assert aggregated['p_nom'] == 400.
+    # (1 * 100 + 0.5 * 300) / 400
+    assert aggregated['p_max_pu'] == '0.625*solar.csv'
+    assert aggregation['solar north aggregated']['weight'] == pytest.approx(0.625)
+
+
+def test_capacities_and_dispatch_are_split_back():
+    _, aggregation = aggregate_components(fixed_generators())
+    profile = pd.Series([0., 0.5, 1.], index=pd.date_range('2016-01-01', periods=3, freq='h'))
+    n = pypsa.Network()
+    n.set_snapshots(profile.index)
+    n.add('Bus', 'bus')
+    n.add('Generator', 'solar north aggregated', bus='bus', carrier='solar', p_nom=400., p_max_pu=0.625 * profile)
+    n.generators['p_nom_opt'] = 400.
+    n.generators_t.p = pd.DataFrame({'solar north aggregated': 0.625 * 400. * profile})
+    n.meta['aggregation'] = aggregation
+    n.model = None
+
+    d = disaggregate_network(n)
+    assert list(d.generators.index) == ['solar north', 'solar south']
+    assert d.generators.p_nom_opt.tolist() == [100., 300.]
+    # The static p_max_pu is not used with a time series and is not scaled
+    assert d.generators.p_max_pu.tolist() == [1., 1.]
+    np.testing.assert_allclose(d.generators_t.p_max_pu['solar north'], profile)
+    np.testing.assert_allclose(d.generators_t.p_max_pu['solar south'], 0.5 * profile)
+    # Dispatch split by available capacity 100 : 150
+    np.testing.assert_allclose(d.generators_t.p['solar north'], 100. * profile)
+    np.testing.assert_allclose(d.generators_t.p['solar south'], 150. * profile)
+    # The aggregated network is not changed
+    assert list(n.generators.index) == ['solar north aggregated']
@@ -0,0 +1,74 @@
+"""
+Tests of the costs interpolated between the cost files of two years
+"""
+import os
+import pandas as pd
+import pytest
+from utilities.cost_database import case_costs, load_cost_cube, interpolate_costs, case_cost_files
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utilities', 'cost_config.yaml')
+
+
+def write_costs(path, rows):
+    """
+    Write a cost file in the format of the PyPSA technology database from (technology, parameter, value, unit)
+    """
+    df = pd.DataFrame(rows, columns=['technology', 'parameter', 'value', 'unit'])
+    df['source'] = 'test'
+    df['further description'] = ''
+    df.to_csv(path, index=False)
+
+
+@pytest.fixture
+def cost_files(tmp_path):
+    write_costs(tmp_path / 'costs_2020.csv', [
+        ('solar', 'investment', 1000., 'EUR/kW'), ('solar', 'FOM', 2., '%/year'), ('solar', 'lifetime', 30., 'years'),
+        ('solar', 'discount rate', 0.05, 'per unit'),
+        ('CCGT', 'investment', 900., 'EUR/kW'), ('CCGT', 'efficiency', 0.5, 'per unit'), ('CCGT', 'VOM', 4., 'EUR/MWh'),
+        ('gas', 'fuel', 20., 'EUR/MWh_th'),
+        # Only in the earlier year
+        ('nuclear', 'investment', 8000., 'EUR/kW')])
+    write_costs(tmp_path / 'costs_2030.csv', [
+        ('solar', 'investment', 600., 'EUR/kW'), ('solar', 'FOM', 3., '%/year'), ('solar', 'lifetime', 40., 'years'),
+        ('solar', 'discount rate', 0.05, 'per unit'),
+        ('CCGT', 'investment', 800., 'EUR/kW'), ('CCGT', 'efficiency', 0.6, 'per unit'), ('CCGT', 'VOM', 4., 'EUR/MWh'),
+        ('gas', 'fuel', 30., 'EUR/MWh_th')])
+    return str(tmp_path / 'costs_{year}.csv')
+
+
+def test_parameters_are_interpolated_linearly(cost_files):
+    case_dict = {'costs_path': cost_files, 'costs_year': 2026, 'costs_years': '2020; 2030'}
+    assert case_cost_files(case_dict) == [cost_files.format(year=2020), cost_files.format(year=2030)]
+    cube = load_cost_cube(cost_files, [2020, 2030], CONFIG)
+    parameters = interpolate_costs(cube, 2026.)
+    # Converted from /kW to /MW
+    assert parameters.at['solar', 'investment'] == pytest.approx(1e3 * (0.4 * 1000. + 0.6 * 600.))
+    assert parameters.at['solar', 'FOM'] == pytest.approx(0.4 * 2. + 0.6 * 3.)
+    assert parameters.at['CCGT', 'efficiency'] == pytest.approx(0.4 * 0.5 + 0.6 * 0.6)
+    assert parameters.at['gas', 'fuel'] == pytest.approx(0.4 * 20. + 0.6 * 30.)
+    # A technology of only one year keeps its value
+    assert parameters.at['nuclear', 'investment'] == pytest.approx(8e6)
+
+    # Costs are derived from the interpolated parameters, not interpolated themselves
+    costs = case_costs(case_dict, CONFIG, 1.)
+    assert costs.at['CCGT', 'marginal_cost'] == pytest.approx(4. + 26. / 0.56)
+    assert costs.loc['solar', 'investment'] == parameters.at['solar', 'investment']
+
+
+def test_cost_year_of_a_file_is_not_interpolated(cost_files):
+    case_dict = {'costs_path': cost_files, 'costs_year': 2030, 'costs_years': '2020; 2030'}
+    assert case_cost_files(case_dict) == [cost_files.format(year=2030)]
+    assert case_costs(case_dict, CONFIG, 1.).at['solar', 'investment'] == pytest.approx(6e5)
+
+
+def test_cost_years_are_read_once(cost_files):
+    cache = {}
+    load_cost_cube(cost_files, [2020, 2030], CONFIG, cache)
+    os.remove(cost_files.format(year=2020))
+    cube = load_cost_cube(cost_files, [2020, 2030], CONFIG, cache)
+    assert sorted(cube.index.get_level_values('year').unique()) == [2020, 2030]
+
+
+def test_cost_year_outside_of_the_files_is_rejected(cost_files):
+    with pytest.raises(ValueError):
+        case_cost_files({'costs_path': cost_files, 'costs_year': 2035, 'costs_years': '2020; 2030'})
@@ -0,0 +1,64 @@
+"""
+Tests of the pipelined execution of cases through stages running in their own threads
+"""
+import sys, threading
+from utilities.pipeline import run_pipeline
+
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
+
+
+def test_cases_pass_all_stages_in_order():
+    stages = [('build', lambda case: case + ' built'), ('solve', lambda case: case + ' solved'),
+              ('write', lambda case: case + ' written')]
+    results = run_pipeline(['a', 'b', 'c'], stages)
+    assert [result['result'] for result in results] == ['a built solved written', 'b built solved written',
+                                                        'c built solved written']
+    assert all(result['status'] == 'complete' and result['error'] is None for result in results)
+    assert set(results[0]['timings']) == {'build', 'solve', 'write'}
+    assert pipeline_threads() == []
+
+
+def test_failing_stage_is_reported_and_pipeline_shuts_down():
+    written = []
+
+    def solve(case):
+        if case == 'infeasible':
+            raise RuntimeError('solver failed')
+        if case == 'bad input':
+            sys.exit('input error')
+        return case
+
+    stages = [('build', lambda case: case), ('solve', solve), ('write', lambda case: written.append(case) or case)]
+    results = run_pipeline(['a', 'infeasible', 'bad input', 'b'], stages)
+    assert [result['status'] for result in results] == ['complete', 'failed', 'failed', 'complete']
+    assert results[1]['stage'] == 'solve' and 'solver failed' in results[1]['error']
+    assert results[2]['stage'] == 'solve' and 'input error' in results[2]['error']
+    # Failed cases are not passed on to the following stages
+    assert written == ['a', 'b']
+    assert 'write' not in results[1]['timings']
+    assert pipeline_threads() == []
+
+
+def test_queue_size_limits_cases_between_stages():
+    release = threading.Event()
+    built = []
+
+    def build(case):
+        built.append(case)
+        return case
+
+    def solve(case):
+        release.wait(timeout=10)
+        return case
+
+    runner = threading.Thread(target=lambda: run_pipeline(list(range(10)), [('build', build), ('solve', solve)], queue_size=2))
+    runner.start()
+    runner.join(timeout=0.5)
+    # One case is solved, two wait in the queue and one built case waits to be put into the queue
+    assert len(built) == 4
+    release.set()
+    runner.join(timeout=10)
+    assert not runner.is_alive()
+    assert len(built) == 10
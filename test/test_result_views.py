@@ -0,0 +1,55 @@
+"""
+Tests of the aggregated views of the time results
+"""
+import numpy as np
+import pandas as pd
+import pypsa
+from utilities.result_views import seasonal_energy, monthly_energy, duration_curves, power_time_series, result_views
+
+
+def test_december_is_counted_in_winter_of_next_year():
+    # One unit of energy every hour from March 2016 to February 2018
+    snapshots = pd.date_range('2016-03-01', '2018-02-28 23:00', freq='h')
+    energy = pd.DataFrame({'solar dispatch': 1.}, index=snapshots)
+    seasons = seasonal_energy(energy)['solar dispatch']
+    assert list(seasons.index) == [(2016, 'MAM'), (2016, 'JJA'), (2016, 'SON'), (2017, 'DJF'), (2017, 'MAM'),
+                                   (2017, 'JJA'), (2017, 'SON'), (2018, 'DJF')]
+    # December 2016, January and February 2017
+    assert seasons[(2017, 'DJF')] == 24 * (31 + 31 + 28)
+    # December 2017, January and February 2018
+    assert seasons[(2018, 'DJF')] == 24 * (31 + 31 + 28)
+    assert seasons.sum() == len(snapshots)
+
+    months = monthly_energy(energy)['solar dispatch']
+    assert months[(2016, 12)] == 24 * 31 and months[(2017, 2)] == 24 * 28
+
+
+def test_duration_curve_is_sorted_from_highest_value():
+    power = pd.DataFrame({'wind dispatch': np.arange(101.)})
+    curve = duration_curves(power)['wind dispatch']
+    assert curve.iloc[0] == 100. and curve.iloc[-1] == 0.
+    assert curve[50.] == 50.
+
+
+def test_views_of_a_network_with_a_store():
+    snapshots = pd.date_range('2016-12-31 22:00', periods=4, freq='h')
+    n = pypsa.Network()
+    n.set_snapshots(snapshots)
+    n.add('Bus', 'bus')
+    n.add('Generator', 'solar', bus='bus')
+    n.add('Store', 'battery', bus='bus')
+    n.generators_t.p = pd.DataFrame({'solar': [4000., 2000., 0., 0.]}, index=snapshots)
+    # Net power of the store, negative while charging
+    n.stores_t.p = pd.DataFrame({'battery': [-3000., -1000., 2000., 1000.]}, index=snapshots)
+
+    power = power_time_series(n, 1000.)
+    assert list(power.columns) == ['solar dispatch', 'battery charged', 'battery discharged']
+    assert power['battery charged'].tolist() == [3., 1., 0., 0.]
+    assert power['battery discharged'].tolist() == [0., 0., 2., 1.]
+
+    views = result_views(n, {'numerics_scaling': 1000})
+    assert set(views) == {'duration curves', 'monthly energy', 'seasonal energy', 'diurnal profiles'}
+    seasons = views['seasonal energy']
+    assert seasons.loc[(2017, 'DJF'), 'battery charged'] == 4.
+    assert seasons.loc[(2017, 'DJF'), 'battery discharged'] == 3.
+    assert views['diurnal profiles'].loc[22, 'solar dispatch'] == 4.
@@ -0,0 +1,70 @@
+"""
+Round trip of runs through the SQLite and Parquet results store
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from utilities.results_store import write_results_to_store, read_results_store
+
+
+def run_results(case_name, system_cost):
+    """
+    Return case data, component list and result dataframes of a small run
+    """
+    case_dict = {'case_name': case_name, 'filename_prefix': 'prefix', 'solver': 'highs', 'numerics_scaling': 1000.,
+                 'delta_t': None, 'no_time_steps': 3, 'nyears': 1.}
+    component_list = [{'component': 'Generator', 'name': 'solar', 'carrier': 'solar', 'bus': 'bus', 'capital_cost': 10.,
+                       'p_max_pu': 'solar.csv'}]
+    snapshots = pd.date_range('2016-01-01', periods=48, freq='h')
+    df_dict = {
+        'case results': pd.DataFrame({'system cost': [system_cost], 'objective': [system_cost]}),
+        'component results': pd.DataFrame({'carrier': ['solar'], 'optimal capacity': [2. * system_cost]},
+                                          index=pd.MultiIndex.from_tuples([('Generator', 'solar')])),
+        'time results': pd.DataFrame({'solar dispatch': np.arange(48.)}, index=snapshots),
+    }
+    return case_dict, component_list, df_dict
+
+
+@pytest.mark.parametrize('store_name', ['store.sqlite', 'store'])
+def test_runs_read_back_by_case_name(tmp_path, store_name):
+    store_path = str(tmp_path / store_name)
+    run_ids = {}
+    for case_name, system_cost in [('case_a', 1.5), ('case_b', 2.5)]:
+        run_ids[case_name] = write_results_to_store(store_path, *run_results(case_name, system_cost), infile=case_name + '.csv',
+                                                    time_resolution='D')
+
+    for case_name, system_cost in [('case_a', 1.5), ('case_b', 2.5)]:
+        runs = read_results_store(store_path, 'runs', case_name)
+        assert runs.run_id.tolist() == [run_ids[case_name]]
+        assert runs.input_file.tolist() == [case_name + '.csv']
+
+        parameters = read_results_store(store_path, 'parameters', case_name).set_index('parameter')
+        assert set(parameters.run_id) == {run_ids[case_name]}
+        assert parameters.at['numerics_scaling', 'value'] == 1000.
+        assert parameters.at['no_time_steps', 'value'] == 3.
+        assert parameters.at['solver', 'text'] == 'highs'
+        assert np.isnan(parameters.at['solver', 'value'])
+        assert parameters.at['delta_t', 'text'] is None
+
+        case_results = read_results_store(store_path, 'case results', case_name).set_index('variable')
+        assert case_results['case_name'].unique().tolist() == [case_name]
+        assert case_results.at['system cost', 'value'] == system_cost
+
+        component_results = read_results_store(store_path, 'component results', case_name)
+        assert component_results[['component', 'name', 'carrier', 'variable']].values.tolist() == \
+            [['Generator', 'solar', 'solar', 'optimal capacity']]
+        assert component_results['value'].tolist() == [2. * system_cost]
+
+        component_inputs = read_results_store(store_path, 'component inputs', case_name)
+        assert component_inputs[['attribute', 'value']].values.tolist() == [['capital_cost', 10.]]
+
+        # Daily means of the hourly dispatch 0 ... 47
+        time_results = read_results_store(store_path, 'time results', case_name)
+        assert time_results['value'].tolist() == [11.5, 35.5]
+
+    assert sorted(read_results_store(store_path, 'runs').run_id) == sorted(run_ids.values())
+
+
+def test_unknown_table_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        read_results_store(str(tmp_path / 'store.sqlite'), 'results')
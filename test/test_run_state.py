@@ -0,0 +1,46 @@
+"""
+Tests of the input hashes that decide whether a resumed case is skipped
+"""
+import socket, threading, functools
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+import pytest
+from utilities.run_state import hash_file
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def served_dir(tmp_path):
+    """
+    Serve tmp_path over HTTP on localhost, return (directory, base URL)
+    """
+    server = HTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield tmp_path, 'http://127.0.0.1:{0}/'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_url_is_hashed_by_content(served_dir):
+    directory, url = served_dir
+    costs_file = directory / 'costs.csv'
+    costs_file.write_text('technology,parameter,value\nsolar,investment,100\n')
+    first_hash = hash_file(url + 'costs.csv')
+    assert first_hash == hash_file(str(costs_file))
+
+    # Same URL, changed costs upstream
+    costs_file.write_text('technology,parameter,value\nsolar,investment,90\n')
+    assert hash_file(url + 'costs.csv') == hash_file(str(costs_file))
+    assert hash_file(url + 'costs.csv') != first_hash
+
+
+def test_unreachable_url_never_matches():
+    # Port without server
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:{0}/costs.csv'.format(s.getsockname()[1])
+    assert hash_file(url) != hash_file(url)
@@ -0,0 +1,68 @@
+"""
+Conversion of time series csv files to time series stores and reading them back
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from utilities.time_series_store import convert_time_series_file, read_time_series, time_series_exists
+from utilities.utilities import read_time_series_file
+
+
+def write_mem_csv(path, dates, columns):
+    """
+    Write a csv file in MEM format: header lines, BEGIN_DATA, year, month, day, hour (1..24) columns
+    """
+    df = pd.DataFrame({'year': dates.year, 'month': dates.month, 'day': dates.day, 'hour': dates.hour + 1})
+    for name, values in columns.items():
+        df[name] = values
+    with open(path, 'w') as f:
+        f.write('Time series in MEM format,,,,\nBEGIN_DATA,,,,\n')
+        df.to_csv(f, index=False)
+
+
+def write_datetime_csv(path, dates, columns):
+    """
+    Write a csv file with BEGIN_DATA followed by a date in the first column
+    """
+    df = pd.DataFrame(columns, index=pd.Index(dates.strftime('%Y-%m-%d %H:%M:%S'), name='time'))
+    with open(path, 'w') as f:
+        f.write('BEGIN_DATA\n')
+        df.to_csv(f)
+
+
+@pytest.mark.parametrize('write_csv', [write_mem_csv, write_datetime_csv])
+def test_store_reads_back_like_csv(tmp_path, write_csv):
+    dates = pd.date_range('2016-01-01', periods=24 * 40, freq='h')
+    rng = np.random.default_rng(0)
+    columns = {'Solar Capacity': rng.random(len(dates)), 'wind capacity': rng.random(len(dates))}
+    csv_file = str(tmp_path / 'sites.csv')
+    write_csv(csv_file, dates, columns)
+
+    store_path = convert_time_series_file(csv_file)
+    assert store_path == str(tmp_path / 'sites.tsstore')
+    assert time_series_exists(store_path + '/solar capacity')
+    assert not time_series_exists(store_path + '/demand')
+
+    # Whole store equals the csv file, column names in lower case
+    expected = read_time_series_file(csv_file)
+    pd.testing.assert_frame_equal(read_time_series(store_path), expected, check_freq=False)
+
+    # A period of one column, both ends included, is the same as from the csv file
+    start, end = '2016-01-10 05:00:00', '2016-01-20 23:00:00'
+    period = read_time_series(store_path + '/Solar Capacity', start, end)
+    assert list(period.columns) == ['solar capacity']
+    assert period.index[0] == pd.Timestamp(start) and period.index[-1] == pd.Timestamp(end)
+    pd.testing.assert_frame_equal(period, read_time_series(csv_file, start, end)[['solar capacity']], check_freq=False)
+    assert read_time_series(store_path, start, end, index_only=True).index.equals(period.index)
+
+
+def test_store_keeps_gaps_in_hourly_series(tmp_path):
+    dates = pd.date_range('2016-01-01', periods=48, freq='h').delete(slice(10, 20))
+    csv_file = str(tmp_path / 'gaps.csv')
+    write_datetime_csv(csv_file, dates, {'demand': np.arange(len(dates), dtype=float)})
+    store_path = convert_time_series_file(csv_file, str(tmp_path / 'other.tsstore'))
+    assert os.path.isdir(store_path)
+    ts = read_time_series(store_path, '2016-01-01 09:00', '2016-01-01 21:00')
+    assert list(ts.index.hour) == [9, 20, 21]
+    assert ts['demand'].tolist() == [9., 10., 11.]
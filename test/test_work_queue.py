@@ -0,0 +1,165 @@
+"""
+Tests of the file-based work queue with a temporary queue directory and short timeouts
+"""
+import os, time, threading
+from utilities.work_queue import (enqueue_cases, claim_job, finish_job, recover_stale_jobs, heartbeat, run_worker,
+                                  job_files, queue_status, read_job_file)
+
+
+def make_stale(path, age=100):
+    """
+    Set the modification time (heartbeat) of a job file age seconds into the past
+    """
+    past = time.time() - age
+    os.utime(path, (past, past))
+
+
+def succeeding_job(input_file):
+    return {'status': 'optimal', 'input_file': input_file}
+
+
+def failing_job(input_file):
+    raise SystemExit('Input error in ' + input_file)
+
+
+def test_claim_moves_job_to_claimed(tmp_path):
+    queue_dir = str(tmp_path)
+    job_id, = enqueue_cases(queue_dir, ['case.csv'])
+    claimed_path, job = claim_job(queue_dir, 'worker-a')
+    assert os.path.basename(claimed_path) == job_id + '.json'
+    assert queue_status(queue_dir) == {'pending': 0, 'claimed': 1, 'done': 0, 'failed': 0}
+    assert read_job_file(claimed_path)['worker'] == 'worker-a'
+    # The claim renews the heartbeat, a job that waited long in pending is not stale right away
+    assert time.time() - os.path.getmtime(claimed_path) < 5
+    assert claim_job(queue_dir, 'worker-b') == (None, None)
+
+    finish_job(queue_dir, claimed_path, job, 'done')
+    assert queue_status(queue_dir) == {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 0}
+
+
+def test_heartbeat_touches_claimed_job(tmp_path):
+    queue_dir = str(tmp_path)
+    enqueue_cases(queue_dir, ['case.csv'])
+    claimed_path, _ = claim_job(queue_dir, 'worker-a')
+    make_stale(claimed_path)
+    stop_event = threading.Event()
+    thread = threading.Thread(target=heartbeat, args=(claimed_path, stop_event, 0.05))
+    thread.start()
+    time.sleep(0.3)
+    stop_event.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert time.time() - os.path.getmtime(claimed_path) < 5
+    assert recover_stale_jobs(queue_dir, stale_timeout=10) == 0
+
+
+def test_stale_jobs_are_recovered_then_failed(tmp_path):
+    queue_dir = str(tmp_path)
+    enqueue_cases(queue_dir, ['case.csv'])
+    claimed_path, _ = claim_job(queue_dir, 'worker-a')
+    assert recover_stale_jobs(queue_dir, stale_timeout=10) == 0
+
+    make_stale(claimed_path)
+    assert recover_stale_jobs(queue_dir, stale_timeout=10, max_attempts=2) == 1
+    pending, = job_files(queue_dir, 'pending')
+    assert read_job_file(pending)['attempts'] == 1
+    # No .recover file is left behind
+    assert os.listdir(os.path.dirname(claimed_path)) == []
+
+    claimed_path, _ = claim_job(queue_dir, 'worker-b')
+    make_stale(claimed_path)
+    assert recover_stale_jobs(queue_dir, stale_timeout=10, max_attempts=2) == 1
+    failed, = job_files(queue_dir, 'failed')
+    assert read_job_file(failed)['attempts'] == 2
+    assert 'heartbeats' in read_job_file(failed)['error']
+
+
+def test_job_being_recovered_is_skipped(tmp_path):
+    queue_dir = str(tmp_path)
+    enqueue_cases(queue_dir, ['case.csv'])
+    claimed_path, _ = claim_job(queue_dir, 'worker-a')
+    make_stale(claimed_path)
+    # Another worker renamed the job first and is recovering it
+    recovering_path = os.path.join(os.path.dirname(claimed_path), '.' + os.path.basename(claimed_path) + '.recover')
+    os.rename(claimed_path, recovering_path)
+    assert recover_stale_jobs(queue_dir, stale_timeout=10) == 0
+    assert queue_status(queue_dir) == {'pending': 0, 'claimed': 0, 'done': 0, 'failed': 0}
+    assert os.path.exists(recovering_path)
+
+
+def test_racing_workers_claim_every_job_once(tmp_path):
+    queue_dir = str(tmp_path)
+    job_ids = enqueue_cases(queue_dir, ['case{0}.csv'.format(i) for i in range(50)])
+    claims = {'worker-a': [], 'worker-b': []}
+    errors = []
+    start = threading.Barrier(2)
+
+    def worker(worker_id):
+        start.wait()
+        try:
+            while True:
+                claimed_path, job = claim_job(queue_dir, worker_id)
+                if claimed_path is None:
+                    return
+                claims[worker_id].append(job['job_id'])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(worker_id,)) for worker_id in claims]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    # Both workers create the claimed directory of the new queue at the same time
+    assert errors == []
+    claimed_ids = claims['worker-a'] + claims['worker-b']
+    assert sorted(claimed_ids) == sorted(job_ids)
+    assert queue_status(queue_dir)['claimed'] == len(job_ids)
+    for path in job_files(queue_dir, 'claimed'):
+        job = read_job_file(path)
+        assert job['job_id'] in claims[job['worker']]
+
+
+def test_racing_recoveries_recover_every_job_once(tmp_path):
+    queue_dir = str(tmp_path)
+    enqueue_cases(queue_dir, ['case{0}.csv'.format(i) for i in range(50)])
+    while True:
+        claimed_path, _ = claim_job(queue_dir, 'worker-a')
+        if claimed_path is None:
+            break
+        make_stale(claimed_path)
+    recovered = []
+    errors = []
+    start = threading.Barrier(2)
+
+    def recover():
+        start.wait()
+        try:
+            recovered.append(recover_stale_jobs(queue_dir, stale_timeout=10))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=recover) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert errors == []
+    assert sum(recovered) == 50
+    assert queue_status(queue_dir) == {'pending': 50, 'claimed': 0, 'done': 0, 'failed': 0}
+    assert all(read_job_file(path)['attempts'] == 1 for path in job_files(queue_dir, 'pending'))
+
+
+def test_worker_runs_queue_until_empty(tmp_path):
+    queue_dir = str(tmp_path)
+    enqueue_cases(queue_dir, ['case0.csv', 'case1.csv'])
+    run_worker(queue_dir, succeeding_job, max_jobs=2, poll_interval=0.1, stale_timeout=10, worker_id='worker-a')
+    assert queue_status(queue_dir) == {'pending': 0, 'claimed': 0, 'done': 2, 'failed': 0}
+    for path in job_files(queue_dir, 'done'):
+        job = read_job_file(path)
+        assert job['result']['input_file'] == job['input_file']
+
+    enqueue_cases(queue_dir, ['case2.csv'])
+    run_worker(queue_dir, failing_job, poll_interval=0.1, stale_timeout=10, worker_id='worker-b')
+    failed, = job_files(queue_dir, 'failed')
+    assert 'Input error' in read_job_file(failed)['result']
@@ -0,0 +1,263 @@
+"""
+Aggregation of equivalent components before the network is built and disaggregation of the results
+
+Components of the same type are equivalent for the optimizer if they connect the same buses and have the
+same carrier, costs and other attributes, so that they only differ in name and capacity. They are merged
+into one aggregated component with summed capacities and bounds. For components with fixed capacity
+the p_max_pu values (or the factors of the same p_max_pu time series file) may differ as well and are
+combined weighted by capacity. After solving, the optimal capacities and time series of an aggregated
+component are split back onto the original components.
+"""
+import logging
+import numpy as np
+import pandas as pd
+from utilities.time_series_store import is_time_series_reference
+
+
+# Component types whose variables can be reduced and the attribute holding their capacity
+CAPACITY_ATTRIBUTES = {'Generator': 'p_nom', 'StorageUnit': 'p_nom', 'Link': 'p_nom', 'Store': 'e_nom'}
+# Attributes that are summed over the aggregated components in addition to capacities
+ADDITIVE_ATTRIBUTES = ['e_initial', 'state_of_charge_initial']
+# Per unit availability that may differ between components with fixed capacity
+WEIGHTED_ATTRIBUTE = 'p_max_pu'
+# Number of variables per snapshot for each component type (p, p0, p_dispatch, p_store, state_of_charge, e)
+VARIABLES_PER_SNAPSHOT = {'Generator': 1, 'Link': 1, 'StorageUnit': 3, 'Store': 2}
+# Units of time series that are split onto the original components, all other time series are copied
+EXTENSIVE_UNITS = ['MW', 'MWh', 'MVar']
+
+
+def split_time_series_value(value):
+    """
+    Return (factor, file name) for a time series reference like 'factor*file.csv' or 'file.csv', else None
+    """
+    if is_time_series_reference(value):
+        if "*" in value:
+            return float(value.split("*")[0]), value.split("*")[1]
+        return 1., value
+    return None
+
+
+def is_fixed(component_dict):
+    """
+    Return True if the component has a fixed capacity, as decided in dicts_to_pypsa
+    """
+    return CAPACITY_ATTRIBUTES[component_dict['component']] in component_dict
+
+
+def is_weighted(component_dict):
+    """
+    Return True if p_max_pu of the component can be combined weighted by capacity
+    """
+    # Normalization rescales the time series independently of its factor
+    return is_fixed(component_dict) and 'normalization' not in component_dict and component_dict['component'] != 'Store'
+
+
+def aggregation_key(component_dict):
+    """
+    Return a hashable key that is equal for components that can be aggregated, or None
+    if the component is never aggregated
+    """
+    component = component_dict['component']
+    if component not in CAPACITY_ATTRIBUTES:
+        return None
+    capacity = CAPACITY_ATTRIBUTES[component]
+    # Explicit extendable flags and bi-directional chargers (constrained by name) are kept as they are
+    if capacity + '_extendable' in component_dict or 'bicharger' in component_dict['name']:
+        return None
+    attrs = dict(component_dict)
+    # Carrier defaults to the component name in dicts_to_pypsa
+    attrs.setdefault('carrier', attrs['name'])
+    items = []
+    for attr, value in attrs.items():
+        if attr in ['name', capacity, capacity + '_min', capacity + '_max'] + ADDITIVE_ATTRIBUTES:
+            continue
+        if attr == WEIGHTED_ATTRIBUTE and is_weighted(component_dict):
+            time_series = split_time_series_value(value)
+            value = ('series', time_series[1]) if time_series is not None else ('scalar',)
+        items.append((attr, value))
+    return (component, is_fixed(component_dict), tuple(sorted(items, key=repr)))
+
+
+def member_info(component_dict):
+    """
+    Return the data of an original component needed to disaggregate the results
+    """
+    capacity = CAPACITY_ATTRIBUTES[component_dict['component']]
+    weight = 1.
+    if is_weighted(component_dict):
+        time_series = split_time_series_value(component_dict.get(WEIGHTED_ATTRIBUTE, 1.))
+        weight = time_series[0] if time_series is not None else float(component_dict.get(WEIGHTED_ATTRIBUTE, 1.))
+    return {'name': component_dict['name'],
+            'capacity': float(component_dict[capacity]) if capacity in component_dict else None,
+            'min': float(component_dict.get(capacity + '_min', 0.)),
+            'max': float(component_dict[capacity + '_max']) if capacity + '_max' in component_dict else None,
+            'weight': weight,
+            'additive': {attr: float(component_dict[attr]) for attr in ADDITIVE_ATTRIBUTES if attr in component_dict}}
+
+
+def aggregate_group(group):
+    """
+    Return the aggregated component dictionary and aggregation info for a group of equivalent components
+    """
+    component = group[0]['component']
+    capacity = CAPACITY_ATTRIBUTES[component]
+    members = [member_info(component_dict) for component_dict in group]
+    aggregated = dict(group[0])
+    aggregated['name'] = '{0} aggregated'.format(group[0]['name'])
+    aggregated.setdefault('carrier', group[0]['name'])
+
+    weight = 1.
+    if is_fixed(group[0]):
+        total = sum(member['capacity'] for member in members)
+        aggregated[capacity] = total
+        if is_weighted(group[0]):
+            # Capacity weighted availability, sum of p_max_pu * p_nom stays the same
+            weight = sum(m['weight'] * m['capacity'] for m in members) / total if total > 0 else members[0]['weight']
+            time_series = split_time_series_value(group[0].get(WEIGHTED_ATTRIBUTE))
+            if time_series is not None:
+                aggregated[WEIGHTED_ATTRIBUTE] = '{0!r}*{1}'.format(weight, time_series[1])
+            elif WEIGHTED_ATTRIBUTE in group[0]:
+                aggregated[WEIGHTED_ATTRIBUTE] = weight
+    else:
+        if any(capacity + '_min' in component_dict for component_dict in group):
+            aggregated[capacity + '_min'] = sum(member['min'] for member in members)
+        if all(member['max'] is not None for member in members):
+            aggregated[capacity + '_max'] = sum(member['max'] for member in members)
+    for attr in ADDITIVE_ATTRIBUTES:
+        if attr in group[0]:
+            aggregated[attr] = sum(member['additive'][attr] for member in members)
+
+    info = {'component': component, 'capacity_attribute': capacity, 'fixed': is_fixed(group[0]),
+            'weight': weight, 'members': members}
+    return aggregated, info
+
+
+def aggregate_components(component_list):
+    """
+    Merge equivalent components in component_list
+    return the reduced component list and a dictionary with the aggregation info keyed by aggregated name
+    """
+    groups = {}
+    for component_dict in component_list:
+        key = aggregation_key(component_dict)
+        groups.setdefault(key if key is not None else id(component_dict), []).append(component_dict)
+
+    reduced_list = []
+    aggregation = {}
+    for group in groups.values():
+        if len(group) == 1:
+            reduced_list.append(group[0])
+            continue
+        aggregated, info = aggregate_group(group)
+        reduced_list.append(aggregated)
+        aggregation[aggregated['name']] = info
+        logging.info("Aggregated {0} {1} components into {2}: {3}".format(
+            len(group), info['component'], aggregated['name'], ', '.join(m['name'] for m in info['members'])))
+    return reduced_list, aggregation
+
+
+def count_removed_variables(aggregation, n_snapshots):
+    """
+    Return the number of optimization variables removed by the aggregation
+    """
+    removed = 0
+    for info in aggregation.values():
+        per_component = VARIABLES_PER_SNAPSHOT[info['component']] * n_snapshots + (0 if info['fixed'] else 1)
+        removed += (len(info['members']) - 1) * per_component
+    return removed
+
+
+def member_capacities(info, optimal_capacity):
+    """
+    Return array of the optimal capacities of the original components of an aggregated component
+    """
+    members = info['members']
+    if info['fixed']:
+        return np.array([member['capacity'] for member in members])
+    minimum = np.array([member['min'] for member in members])
+    headroom = np.array([member['max'] - member['min'] if member['max'] is not None else np.inf for member in members])
+    remaining = max(optimal_capacity - minimum.sum(), 0.)
+    if np.isinf(headroom).any():
+        # Components without upper bound take the capacity above the lower bounds in equal parts
+        share = np.isinf(headroom) / np.isinf(headroom).sum()
+    elif headroom.sum() > 0:
+        share = headroom / headroom.sum()
+    else:
+        share = np.full(len(members), 1. / len(members))
+    return minimum + remaining * share
+
+
+def member_split(info, optimal_capacity):
+    """
+    Return (optimal capacities, share of the available capacity, relative availability) arrays of the original
+    components of an aggregated component
+    """
+    capacities = member_capacities(info, optimal_capacity)
+    weights = np.array([member['weight'] for member in info['members']])
+    available = capacities * weights
+    share = available / available.sum() if available.sum() > 0 else np.full(len(capacities), 1. / len(capacities))
+    return capacities, share, weights / info['weight']
+
+
+def disaggregate_network(n):
+    """
+    Return a copy of the solved network in which every aggregated component is replaced by the original
+    components, with optimal capacities and time series split by their share of the available capacity.
+    Return n itself if no components were aggregated.
+    """
+    aggregation = n.meta.get('aggregation')
+    if not aggregation:
+        return n
+    # The optimization model can not be copied and is not needed for the results, it stays with the original network
+    original = n
+    model = original.model
+    original.model = None
+    try:
+        n = original.copy()
+    finally:
+        original.model = model
+
+    for name, info in aggregation.items():
+        component = info['component']
+        capacity = info['capacity_attribute']
+        list_name = n.components[component]['list_name']
+        static = getattr(n, list_name)
+        dynamic = getattr(n, list_name + '_t')
+        attrs = n.components[component]['attrs']
+        row = static.loc[name]
+        members = info['members']
+
+        capacities, share, _ = member_split(info, row[capacity + '_opt'])
+
+        member_rows = []
+        for member, member_capacity in zip(members, capacities):
+            member_row = row.copy()
+            member_row[capacity + '_opt'] = member_capacity
+            if info['fixed']:
+                member_row[capacity] = member['capacity']
+            else:
+                member_row[capacity + '_min'] = member['min']
+                member_row[capacity + '_max'] = member['max'] if member['max'] is not None else np.inf
+            # A p_max_pu time series is split below, the static value is then not used and stays as it is
+            if info['weight'] != 1. and name not in dynamic[WEIGHTED_ATTRIBUTE].columns:
+                member_row[WEIGHTED_ATTRIBUTE] = row[WEIGHTED_ATTRIBUTE] * member['weight'] / info['weight']
+            for attr, value in member['additive'].items():
+                member_row[attr] = value
+            member_rows.append(member_row.rename(member['name']))
+        static = pd.concat([static.drop(name), pd.DataFrame(member_rows)])
+        static.index.name = component
+        setattr(n, list_name, static)
+
+        for key, df in dynamic.items():
+            if name not in df.columns:
+                continue
+            unit = attrs.at[key, 'unit'] if key in attrs.index else None
+            if unit in EXTENSIVE_UNITS:
+                columns = {member['name']: df[name] * member_share for member, member_share in zip(members, share)}
+            elif key == WEIGHTED_ATTRIBUTE and info['weight'] != 1.:
+                columns = {member['name']: df[name] * member['weight'] / info['weight'] for member in members}
+            else:
+                columns = {member['name']: df[name] for member in members}
+            dynamic[key] = pd.concat([df.drop(columns=name), pd.DataFrame(columns, index=df.index)], axis=1)
+            dynamic[key].columns.name = component
+    return n
@@ -0,0 +1,152 @@
+"""
+Technology database values for the component data
+
+Cells with 'db', 'db_<attr>' or '<factor>*db_<attr>' are collected while the component data is read and resolved
+together afterwards with one indexed lookup in the cost table, so that all missing technology/attribute pairs are
+reported at once.
+The cost table is read from costs_path. If costs_path contains '{year}' (e.g. 'costs_{year}.csv'), the table for
+costs_year is interpolated linearly between the two closest years of costs_years (default 2020 to 2050 in steps
+of 5 as in the PyPSA technology database). The technology parameters (investment, FOM, lifetime, VOM, fuel,
+efficiency, ...) are interpolated, and capital and marginal costs are derived from the interpolated parameters.
+Parameter tables of the years are kept in a cost cube indexed by year and technology, so that they are read only
+once for several cases with a shared cache.
+"""
+import logging
+import numpy as np
+import pandas as pd
+from utilities.load_costs import load_costs, read_cost_parameters, derive_costs
+from utilities.utilities import is_number
+
+
+# Years of the cost files of the PyPSA technology database
+DEFAULT_COST_YEARS = list(range(2020, 2055, 5))
+
+
+def parse_db_reference(attr, val):
+    """
+    Return (database attribute, factor) for a cell 'db', 'db_<attr>' or '<factor>*db_<attr>'
+    """
+    if val == 'db':
+        return attr, 1.
+    if '*' in val:
+        return val.split('*')[1].replace('db_', ''), float(val.split('*')[0])
+    return val.replace('db_', ''), 1.
+
+
+def resolve_db_references(references, costs_df):
+    """
+    Set the database values of all references (component dictionary, attribute, technology, database attribute,
+    factor) with one lookup in costs_df
+    Return the list of missing (technology, database attribute) pairs.
+    """
+    if not references:
+        return []
+    technologies = [reference[2] for reference in references]
+    db_attributes = [reference[3] for reference in references]
+    rows = costs_df.index.get_indexer(technologies)
+    columns = costs_df.columns.get_indexer(db_attributes)
+    found = (rows >= 0) & (columns >= 0)
+    values = np.full(len(references), np.nan)
+    values[found] = costs_df.to_numpy(dtype=float)[rows[found], columns[found]]
+    factors = np.array([reference[4] for reference in references])
+
+    missing = []
+    for (comp_dict, attr, technology, db_attribute, _), value, is_found in zip(references, values * factors, found):
+        if is_found:
+            comp_dict[attr] = value
+        elif (technology, db_attribute) not in missing:
+            missing.append((technology, db_attribute))
+    logging.info('Using {0} technology database values'.format(int(found.sum())))
+    return missing
+
+
+def missing_values_message(missing, costs_df):
+    """
+    Return error message listing all missing technology/attribute pairs
+    """
+    return 'Technology database has no value for technology/attribute: ' + ', '.join(
+        '{0}/{1}{2}'.format(technology, db_attribute, '' if technology in costs_df.index else ' (technology not in database)')
+        for technology, db_attribute in missing)
+
+
+def parse_cost_years(value):
+    """
+    Return sorted list of years from a value like '2020; 2030; 2040', or the default years if not given
+    """
+    if value is None:
+        return DEFAULT_COST_YEARS
+    return sorted(int(float(year)) for year in str(value).replace(',', ';').split(';') if year.strip())
+
+
+def bracketing_years(year, years):
+    """
+    Return (lower, upper) years of years that enclose year, equal if year is one of them
+    """
+    if year < years[0] or year > years[-1]:
+        raise ValueError('costs_year {0} is outside of the years of the costs files {1} to {2}'.format(year, years[0], years[-1]))
+    lower = max(y for y in years if y <= year)
+    upper = min(y for y in years if y >= year)
+    return lower, upper
+
+
+def load_cost_cube(costs_path, years, config, cache=None):
+    """
+    Return cost cube (dataframe indexed by year and technology) of the technology parameters of the costs files
+    of years, reading only the years that are not in the cache
+    """
+    tables = cache.setdefault('cost cube', {}) if cache is not None else {}
+    for year in years:
+        if (costs_path, year) not in tables:
+            tables[(costs_path, year)] = read_cost_parameters(costs_path.format(year=year), config)
+    return pd.concat({year: tables[(costs_path, year)] for year in years}, names=['year', 'technology'])
+
+
+def interpolate_costs(cube, year):
+    """
+    Return parameter table for year, interpolated linearly between the closest years of the cost cube.
+    Values that exist only in one of the two years are taken from that year.
+    """
+    years = sorted(cube.index.get_level_values('year').unique())
+    lower, upper = bracketing_years(year, years)
+    if lower == upper:
+        return cube.loc[lower].copy()
+    weight = (year - lower) / (upper - lower)
+    lower_costs, upper_costs = cube.loc[lower].align(cube.loc[upper], join='outer')
+    costs = lower_costs * (1 - weight) + upper_costs * weight
+    return costs.fillna(lower_costs).fillna(upper_costs)
+
+
+def case_cost_years(case_dict):
+    """
+    Return list of the years of the costs files needed to interpolate the costs for costs_year
+    """
+    if not is_number(case_dict.get('costs_year', '')):
+        raise ValueError('costs_path {0} contains {{year}}, costs_year must be a year. Failed = {1}'.format(
+            case_dict['costs_path'], case_dict.get('costs_year')))
+    return sorted(set(bracketing_years(float(case_dict['costs_year']), parse_cost_years(case_dict.get('costs_years')))))
+
+
+def case_cost_files(case_dict):
+    """
+    Return list of the costs files used for a case
+    """
+    costs_path = str(case_dict['costs_path'])
+    if '{year}' not in costs_path:
+        return [costs_path]
+    return [costs_path.format(year=year) for year in case_cost_years(case_dict)]
+
+
+def case_costs(case_dict, config, nyears, cache=None):
+    """
+    Return the cost table of a case from costs_path, interpolated for costs_year if costs_path contains '{year}'
+    """
+    costs_path = str(case_dict['costs_path'])
+    if '{year}' not in costs_path:
+        if cache is not None and (costs_path, nyears) in cache.setdefault('costs', {}):
+            return cache['costs'][(costs_path, nyears)].copy()
+        costs = load_costs(tech_costs=costs_path, config=config, Nyears=nyears)
+        if cache is not None:
+            cache['costs'][(costs_path, nyears)] = costs.copy()
+        return costs
+    cube = load_cost_cube(costs_path, case_cost_years(case_dict), config, cache)
+    return derive_costs(interpolate_costs(cube, float(case_dict['costs_year'])), config, nyears)
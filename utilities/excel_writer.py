@@ -0,0 +1,208 @@
+"""
+Streaming Excel writer for the results workbook
+
+Writes sheets row by row with xlsxwriter in constant_memory mode, so that rows are flushed to disk as soon as
+they are complete instead of keeping the whole workbook in memory. Numeric values are taken in chunks directly
+from the result arrays and written with write_row as float rows, only columns with NaN or infinity are converted
+to cells. Datetimes are converted to Excel serial numbers for a whole chunk at once. The layout matches DataFrame.to_excel (header style, date format, empty cells for NaN), except that
+the labels of outer index levels are repeated in every row instead of merged, as merged ranges can not be written
+row by row. Sheets with more rows than Excel allows are continued on numbered sheets ('time results 2', ...).
+"""
+import logging
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+
+# Rows per sheet in Excel, including the header row
+EXCEL_MAX_ROWS = 1048576
+# Maximum length of a sheet name in Excel
+EXCEL_MAX_SHEET_NAME = 31
+# Rows taken from the result arrays at once
+CHUNK_ROWS = 10000
+# Formats used by DataFrame.to_excel
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+INF_REP = 'inf'
+
+
+def continuation_sheet_name(sheet_name, number):
+    """
+    Return the name of the number-th sheet of a sheet split over several sheets
+    """
+    if number == 1:
+        return sheet_name
+    suffix = ' {0}'.format(number)
+    return sheet_name[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix
+
+
+def excel_serial(values):
+    """
+    Return array of Excel serial day numbers for an array of datetimes, NaT as NaN
+    """
+    values = pd.DatetimeIndex(values)
+    if values.tz is not None:
+        values = values.tz_localize(None)
+    serial = (values - EXCEL_EPOCH) / pd.Timedelta(days=1)
+    return np.asarray(serial, dtype=np.float64)
+
+
+def column_chunk(series):
+    """
+    Return (kind, array of values) of a chunk of a column, with kind 'number', 'datetime' or 'object'
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return 'datetime', excel_serial(series)
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return 'number', series.to_numpy(dtype=np.float64)
+    return 'object', series.to_numpy(dtype=object)
+
+
+def number_cells(values):
+    """
+    Return object array of the cells of a float array like DataFrame.to_excel: NaN as None (empty cell),
+    infinity as text, for write_row
+    """
+    cells = values.astype(object)
+    cells[np.isnan(values)] = None
+    cells[values == np.inf] = INF_REP
+    cells[values == -np.inf] = '-' + INF_REP
+    return cells
+
+
+def column_blocks(columns):
+    """
+    Return list of (first column, kind, values) with consecutive columns of the same kind joined into one
+    2d block for write_row. Number columns are passed on as float rows, only the columns of a chunk that contain
+    NaN or infinity are converted to cells of kind 'cells'.
+    columns: list of (kind, array of values) of column_chunk
+    """
+    blocks = []
+    for col, (kind, values) in enumerate(columns):
+        if kind == 'number' and not np.isfinite(values).all():
+            kind = 'cells'
+        if kind in ['number', 'cells'] and blocks and blocks[-1][1] == kind:
+            blocks[-1][2].append(values)
+        else:
+            blocks.append((col, kind, [values] if kind in ['number', 'cells'] else values))
+    return [(col, kind, np.column_stack(values) if kind == 'number' else
+             number_cells(np.column_stack(values)) if kind == 'cells' else values)
+            for col, kind, values in blocks]
+
+
+def write_number(worksheet, row, col, value, cell_format=None):
+    """
+    Write a float like DataFrame.to_excel: NaN as empty cell, infinity as text
+    """
+    if value != value:
+        if cell_format is not None:
+            worksheet.write_blank(row, col, None, cell_format)
+    elif value in (np.inf, -np.inf):
+        worksheet.write_string(row, col, INF_REP if value > 0 else '-' + INF_REP, cell_format)
+    else:
+        worksheet.write_number(row, col, value, cell_format)
+
+
+def write_value(worksheet, row, col, value, cell_format=None, datetime_format=None):
+    """
+    Write a single value of an object column like DataFrame.to_excel
+    """
+    if value is None or (isinstance(value, float) and value != value) or value is pd.NaT:
+        if cell_format is not None:
+            worksheet.write_blank(row, col, None, cell_format)
+    elif isinstance(value, (bool, np.bool_)):
+        worksheet.write_boolean(row, col, bool(value), cell_format)
+    elif isinstance(value, (int, float, np.integer, np.floating)):
+        write_number(worksheet, row, col, float(value), cell_format)
+    elif isinstance(value, (pd.Timestamp, np.datetime64)):
+        worksheet.write_number(row, col, excel_serial([value])[0], datetime_format)
+    elif isinstance(value, str):
+        worksheet.write_string(row, col, value, cell_format)
+    else:
+        # Other objects (e.g. time series in the component inputs) are written as text
+        worksheet.write_string(row, col, str(value), cell_format)
+
+
+def add_formats(workbook):
+    """
+    Return dictionary of the cell formats used by DataFrame.to_excel
+    """
+    return {'header': workbook.add_format(HEADER_FORMAT),
+            'index datetime': workbook.add_format(dict(HEADER_FORMAT, num_format=DATETIME_FORMAT)),
+            'datetime': workbook.add_format({'num_format': DATETIME_FORMAT})}
+
+
+def add_sheet(workbook, sheet_name, number, df, index, header, formats):
+    """
+    Add the number-th sheet of a sheet and write the header row with index names and column names
+    """
+    worksheet = workbook.add_worksheet(continuation_sheet_name(sheet_name, number))
+    if number > 1:
+        logging.info("Sheet {0} continued on sheet {1}".format(sheet_name, worksheet.name))
+    n_index = df.index.nlevels if index else 0
+    if index and any(name is not None for name in df.index.names):
+        for col, name in enumerate(df.index.names):
+            write_value(worksheet, 0, col, name, formats['header'])
+    for col, name in enumerate(header):
+        if name is None or name == '':
+            worksheet.write_blank(0, n_index + col, None, formats['header'])
+        else:
+            write_value(worksheet, 0, n_index + col, name, formats['header'])
+    return worksheet
+
+
+def write_index_cell(worksheet, row, level, kind, value, formats):
+    """
+    Write an index cell in header style
+    """
+    if kind == 'datetime':
+        worksheet.write_number(row, level, value, formats['index datetime'])
+    else:
+        write_value(worksheet, row, level, value, formats['header'])
+
+
+def write_sheet(workbook, sheet_name, df, index, header, formats, max_rows=EXCEL_MAX_ROWS, chunk_rows=CHUNK_ROWS):
+    """
+    Write a dataframe to a sheet row by row, continuing on numbered sheets after max_rows rows
+    """
+    header = list(header) if header is not None else [str(col) for col in df.columns]
+    n_index = df.index.nlevels if index else 0
+    # Data rows per sheet below the header row
+    rows_per_sheet = max_rows - 1
+    if len(df) == 0:
+        add_sheet(workbook, sheet_name, 1, df, index, header, formats)
+        return
+    for chunk_start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[chunk_start:chunk_start + chunk_rows]
+        index_columns = [column_chunk(chunk.index.get_level_values(level).to_series()) for level in range(n_index)]
+        data_blocks = column_blocks([column_chunk(chunk.iloc[:, col]) for col in range(chunk.shape[1])])
+        for i in range(len(chunk)):
+            number, row = divmod(chunk_start + i, rows_per_sheet)
+            row += 1
+            if row == 1:
+                worksheet = add_sheet(workbook, sheet_name, number + 1, df, index, header, formats)
+            for level, (kind, values) in enumerate(index_columns):
+                write_index_cell(worksheet, row, level, kind, values[i], formats)
+            for col, kind, values in data_blocks:
+                if kind in ['number', 'cells']:
+                    worksheet.write_row(row, n_index + col, values[i])
+                elif kind == 'datetime':
+                    if values[i] == values[i]:
+                        worksheet.write_number(row, n_index + col, values[i], formats['datetime'])
+                else:
+                    write_value(worksheet, row, n_index + col, values[i], datetime_format=formats['datetime'])
+
+
+def write_excel_streaming(file_name, sheets, max_rows=EXCEL_MAX_ROWS):
+    """
+    Write sheets to an Excel workbook in constant memory mode.
+    sheets: list of (sheet name, dataframe, write index (bool), header labels or None for the column names)
+    """
+    workbook = xlsxwriter.Workbook(file_name, {'constant_memory': True})
+    try:
+        formats = add_formats(workbook)
+        for sheet_name, df, index, header in sheets:
+            write_sheet(workbook, sheet_name, df, index, header, formats, max_rows=max_rows)
+    finally:
+        workbook.close()
@@ -18,9 +18,9 @@ def calculate_annuity(n, r):
     else:
         return 1 / n
 
-def load_costs(tech_costs, config, Nyears=1.0):
+def read_cost_parameters(tech_costs, config):
     """
-    Create and return a costs dataframe loaded from the tech_costs file
+    Return dataframe of the technology parameters (investment, FOM, lifetime, ...) read from the tech_costs file
     config: a yaml file
     """
     # Read in costs from csv file
@@ -35,7 +35,19 @@ def load_costs(tech_costs, config, Nyears=1.0):
     costs.unit = costs.unit.str.replace("/kW", "/MW")
 
     fill_values = config["fill_values"]
-    costs = costs.value.unstack().fillna(fill_values)
+    return costs.value.unstack().fillna(fill_values)
+
+def derive_costs(parameters, config, Nyears=1.0):
+    """
+    Return costs dataframe with capital_cost, marginal_cost and co2_emissions derived from the
+    technology parameters of read_cost_parameters
+    config: a yaml file
+    """
+    costs = parameters.copy()
+
+    # Load config files
+    with open(config, "r") as f:
+        config = yaml.safe_load(f)
 
     costs["capital_cost"] = (
         (
@@ -63,3 +75,10 @@ def load_costs(tech_costs, config, Nyears=1.0):
             costs.loc[overwrites.index, attr] = overwrites
 
     return costs
+
+def load_costs(tech_costs, config, Nyears=1.0):
+    """
+    Create and return a costs dataframe loaded from the tech_costs file
+    config: a yaml file
+    """
+    return derive_costs(read_cost_parameters(tech_costs, config), config, Nyears)
@@ -0,0 +1,228 @@
+"""
+Modelling to generate alternatives (MGA): near-optimal solutions of a solved network
+
+After the optimal solve, a constraint limiting the system cost to (1 + mga_slack) times the optimal objective
+is added once to the linopy model of the network. For every direction (e.g. 'min solar' or 'max wind') only the
+objective is replaced by the total capacity of the components with that carrier (or name), and the model is
+solved again, warm started from the basis of the previous direction. The first direction is warm started from
+the basis of the optimal solve, with the cost constraint added as a basic row. With mga_processes > 1 the
+directions are solved in a process pool from a copy of the model written to a netcdf file, each warm started
+from the basis of the optimal solve.
+"""
+import os, logging, tempfile
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import linopy
+from utilities.sensitivity import CAPACITY_ATTRIBUTES, capacity_scaling
+from utilities.aggregation import member_capacities
+from utilities.utilities import is_number
+
+
+MGA_SENSES = ['min', 'max']
+COST_CONSTRAINT = 'mga-cost-slack'
+# Solvers that write the basis of a solve for the warm start of the directions
+BASIS_SOLVERS = ['highs', 'gurobi']
+HIGHS_BASIS_HEADER = 'HiGHS_basis_file v2'
+
+
+def parse_mga_directions(value):
+    """
+    Return list of (sense, carrier or component name) from a string like 'min solar; max wind'
+    """
+    directions = []
+    for item in str(value).split(';'):
+        parts = item.split()
+        if not parts:
+            continue
+        if len(parts) < 2 or parts[0].lower() not in MGA_SENSES:
+            raise ValueError("MGA direction '{0}' must be 'min <carrier>' or 'max <carrier>'".format(item.strip()))
+        directions.append((parts[0].lower(), ' '.join(parts[1:])))
+    return directions
+
+
+def validate_mga(case_dict, component_list, problems):
+    """
+    Check the MGA case data keys and that every direction refers to the carrier or name of an extendable component
+    """
+    if case_dict.get('mga_directions') is None:
+        return
+    try:
+        directions = parse_mga_directions(case_dict['mga_directions'])
+    except ValueError as e:
+        problems.append(str(e))
+        directions = []
+    # Components without capacity are extendable, the carrier defaults to the name
+    targets = set()
+    for component_dict in component_list:
+        capacity = CAPACITY_ATTRIBUTES.get(component_dict['component'])
+        if capacity is not None and (capacity not in component_dict or component_dict.get(capacity + '_extendable')):
+            targets.update([component_dict['name'], component_dict.get('carrier', component_dict['name'])])
+    for sense, target in directions:
+        if target not in targets:
+            problems.append("MGA direction '{0} {1}' has no extendable component with this carrier or name".format(sense, target))
+    if not is_number(case_dict.get('mga_slack', '')) or float(case_dict['mga_slack']) < 0:
+        problems.append('mga_slack must be a number >= 0 when mga_directions is given. Failed = {0}'.format(case_dict.get('mga_slack')))
+    if case_dict.get('mga_processes') is not None and (not is_number(case_dict['mga_processes']) or int(case_dict['mga_processes']) < 1):
+        problems.append('mga_processes must be a positive integer. Failed = {0}'.format(case_dict['mga_processes']))
+
+
+def direction_terms(n, target):
+    """
+    Return list of (capacity variable name, component names) of the extendable components with carrier or name target
+    """
+    terms = []
+    for component, capacity in CAPACITY_ATTRIBUTES.items():
+        static = n.static(component)
+        selected = static.index[static[capacity + '_extendable'] & ((static['carrier'] == target) | (static.index == target))]
+        if len(selected):
+            terms.append(('{0}-{1}'.format(component, capacity), list(selected)))
+    return terms
+
+
+def direction_objective(m, terms):
+    """
+    Return linear expression of the total capacity of the variables in terms
+    """
+    expressions = [m.variables[variable].loc[names].sum() for variable, names in terms]
+    return sum(expressions[1:], expressions[0])
+
+
+def capacity_solution(m):
+    """
+    Return series of the optimal capacities of the extendable components in the current solution of the model
+    """
+    capacities = {}
+    for component, capacity in CAPACITY_ATTRIBUTES.items():
+        variable = '{0}-{1}'.format(component, capacity)
+        if variable in m.variables:
+            for name, value in m.variables[variable].solution.to_pandas().items():
+                capacities[(component, name)] = value
+    return pd.Series(capacities, dtype=float)
+
+
+def solve_direction(m, sense, terms, solver_name, warmstart_fn=None, basis_fn=None):
+    """
+    Replace the objective of the model by the total capacity of terms, solve and
+    return (status, condition, system cost, capacities)
+    """
+    m.add_objective(direction_objective(m, terms), overwrite=True, sense=sense)
+    kwargs = {'warmstart_fn': warmstart_fn} if warmstart_fn is not None and os.path.exists(warmstart_fn) else {}
+    status, condition = m.solve(solver_name=solver_name, basis_fn=basis_fn, **kwargs)
+    if status != 'ok':
+        return status, condition, float('nan'), pd.Series(dtype=float)
+    cost = float(m.constraints[COST_CONSTRAINT].lhs.solution.sum())
+    return status, condition, cost, capacity_solution(m)
+
+
+def solve_direction_from_file(model_file, sense, terms, solver_name, warmstart_fn=None):
+    """
+    Process pool worker: read the model with the cost constraint from a netcdf file and solve one direction
+    """
+    return solve_direction(linopy.read_netcdf(model_file), sense, terms, solver_name, warmstart_fn)
+
+
+def extend_basis(m, basis_fn, extended_fn):
+    """
+    Return the name of a basis file for the model with the cost constraint from the basis of the optimal solve,
+    with the cost constraint as basic row, which keeps the basis valid. Gurobi basis files only list nonbasic rows
+    and are used as they are. Return None if the basis can not be extended.
+    """
+    if basis_fn is None or not os.path.exists(basis_fn):
+        return None
+    with open(basis_fn) as f:
+        lines = f.read().splitlines()
+    if not lines or not lines[0].startswith('HiGHS'):
+        return basis_fn
+    rows = [i for i, line in enumerate(lines) if line.startswith('# Rows')]
+    if lines[0] != HIGHS_BASIS_HEADER or not rows:
+        logging.info("Basis file {0} has an unknown format, the first MGA direction is not warm started.".format(basis_fn))
+        return None
+    # The cost constraint has the largest label and is the last row of the model
+    lines[rows[0]] = '# Rows {0}'.format(int(lines[rows[0]].split()[-1]) + 1)
+    lines.append('c{0} 1'.format(int(m.constraints[COST_CONSTRAINT].labels.item())))
+    with open(extended_fn, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return extended_fn
+
+
+def alternatives_table(n, case_dict, solutions):
+    """
+    Return dataframe with the system cost and the capacities of all components for the optimal solution
+    and every alternative, in the units of the input file
+    """
+    scaling_factor = float(case_dict['numerics_scaling'])
+    aggregation = n.meta.get('aggregation') or {}
+    rows = []
+    for alternative, (status, condition, cost, capacities) in solutions.items():
+        row = {'status': '{0} ({1})'.format(status, condition), 'objective [{0}]'.format(case_dict['currency']): cost / scaling_factor}
+        for component, capacity in CAPACITY_ATTRIBUTES.items():
+            static = n.static(component)
+            scale = capacity_scaling(n, component, static.index, scaling_factor)
+            for name in static.index:
+                # Fixed capacities are the same in all alternatives, alternatives without solution have no capacities
+                value = capacities.get((component, name), float('nan')) if static.at[name, capacity + '_extendable'] \
+                    else static.at[name, capacity]
+                if name not in aggregation:
+                    row['{0} {1}'.format(name, capacity)] = value / scale[name]
+                    continue
+                # Aggregated capacities are split back onto the original components
+                members = aggregation[name]['members']
+                values = member_capacities(aggregation[name], value) if value == value else [float('nan')] * len(members)
+                for member, member_value in zip(members, values):
+                    row['{0} {1}'.format(member['name'], capacity)] = member_value / scale[name]
+        rows.append(pd.Series(row, name=alternative))
+    df = pd.DataFrame(rows)
+    df.index.name = 'alternative'
+    return df
+
+
+def run_mga(n, case_dict, basis_fn=None):
+    """
+    Solve the near-optimal alternatives given by mga_directions and mga_slack for the solved network n
+    basis_fn: basis file of the optimal solve, used to warm start the directions
+    return a dataframe with the capacities of the optimal solution and all alternatives
+    The optimal solution stored in n is not changed, the model is restored to its original objective.
+    """
+    m = n.model
+    slack = float(case_dict['mga_slack'])
+    processes = int(case_dict.get('mga_processes') or 1)
+    optimal_cost = float(m.objective.value)
+    solutions = {'optimal': ('ok', 'optimal', optimal_cost, capacity_solution(m))}
+
+    # Limit the system cost to the optimal objective plus slack
+    original_objective = m.objective.expression
+    m.add_constraints(original_objective <= (1 + slack) * optimal_cost, name=COST_CONSTRAINT)
+
+    directions = []
+    for sense, target in parse_mga_directions(case_dict['mga_directions']):
+        terms = direction_terms(n, target)
+        if not terms:
+            logging.error("MGA direction '{0} {1}' has no extendable component with this carrier or name, skipping it.".format(sense, target))
+            continue
+        directions.append(('{0} {1}'.format(sense, target), sense, terms))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            optimal_basis_fn = extend_basis(m, basis_fn, os.path.join(tmp_dir, 'mga_optimal.bas'))
+            if processes > 1 and len(directions) > 1:
+                model_file = os.path.join(tmp_dir, 'mga_model.nc')
+                m.to_netcdf(model_file)
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    futures = {alternative: executor.submit(solve_direction_from_file, model_file, sense, terms, case_dict['solver'],
+                                                            optimal_basis_fn)
+                               for alternative, sense, terms in directions}
+                    for alternative, future in futures.items():
+                        solutions[alternative] = future.result()
+            else:
+                # Each direction is warm started from the basis of the previous one, the model only differs in its objective
+                direction_basis_fn = optimal_basis_fn
+                for i, (alternative, sense, terms) in enumerate(directions):
+                    warmstart_fn = direction_basis_fn
+                    direction_basis_fn = os.path.join(tmp_dir, 'mga_{0}.bas'.format(i))
+                    solutions[alternative] = solve_direction(m, sense, terms, case_dict['solver'], warmstart_fn, direction_basis_fn)
+            for alternative in solutions:
+                logging.info("MGA alternative {0}: {1}".format(alternative, solutions[alternative][:3]))
+        finally:
+            m.remove_constraints(COST_CONSTRAINT)
+            m.add_objective(original_objective, overwrite=True, sense='min')
+    return alternatives_table(n, case_dict, solutions)
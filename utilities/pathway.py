@@ -0,0 +1,149 @@
+"""
+Myopic multi-period pathway runs
+
+A case file with the case data key pathway_periods references a csv file with one row per period: the year in
+the column 'period' and case data values that replace those of the case file for this period, e.g. costs_path,
+datetime_start, datetime_end and total_hours. The periods are run in order as separate cases (with output
+filename_prefix '<filename_prefix>_<period>'). Capacities built in a period by extendable components are added
+to the following periods as components with fixed capacity named '<name>-<build year>', until their lifetime
+(the lifetime attribute of the component, default infinite) has passed. A solve is warm started from the basis
+of the previous period only if both periods have the same components and time window, as the basis does not fit
+a model of a different size.
+Capacities are carried in the units of the model, so numerics_scaling has to be the same in all periods.
+"""
+import os
+import numpy as np
+import pandas as pd
+from utilities.read_input import read_csv_file
+from utilities.sensitivity import CAPACITY_ATTRIBUTES
+from utilities.utilities import is_number
+
+
+# Capacities below this value are not carried to the next period
+MIN_CARRIED_CAPACITY = 1e-6
+
+
+def pathway_periods_path(case_dict):
+    """
+    Return the path of the pathway periods file, relative paths are taken from input_path
+    """
+    return os.path.join(case_dict['input_path'], str(case_dict['pathway_periods']))
+
+
+def read_pathway_periods(case_dict):
+    """
+    Return list of (period year, dictionary of case data overrides) from the pathway periods file, in file order
+    Blank cells keep the value of the case file.
+    """
+    rows = read_csv_file(pathway_periods_path(case_dict))
+    header = [str(col).strip() for col in rows[0]]
+    periods = []
+    for row in rows[1:]:
+        values = dict(zip(header, row))
+        if values.get('period') is None:
+            continue
+        overrides = {key: value for key, value in values.items() if key != 'period' and value is not None}
+        periods.append((int(values['period']), overrides))
+    return periods
+
+
+def validate_pathway(case_dict, problems):
+    """
+    Check the pathway periods file
+    """
+    if case_dict.get('pathway_periods') is None:
+        return
+    path = pathway_periods_path(case_dict)
+    if not os.path.exists(path):
+        problems.append('pathway_periods file {0} not found'.format(path))
+        return
+    header = [str(col).strip() for col in read_csv_file(path)[0]]
+    if 'period' not in header:
+        problems.append('pathway_periods file {0} must have a column "period"'.format(path))
+        return
+    try:
+        years = [year for year, _ in read_pathway_periods(case_dict)]
+    except (ValueError, TypeError):
+        problems.append('Periods in pathway_periods file {0} must be years'.format(path))
+        return
+    if not years:
+        problems.append('pathway_periods file {0} has no periods'.format(path))
+    elif any(later <= earlier for earlier, later in zip(years, years[1:])):
+        problems.append('Periods in pathway_periods file {0} must be increasing. Failed = {1}'.format(path, years))
+
+
+def period_overrides(case_dict, year, overrides):
+    """
+    Return the case data overrides of a period, with a filename_prefix for the period unless one is given
+    """
+    overrides = dict(overrides)
+    overrides.setdefault('filename_prefix', '{0}_{1}'.format(case_dict['filename_prefix'], year))
+    return overrides
+
+
+def installed_capacities(n):
+    """
+    Return list of dictionaries with the optimal capacity, capital cost and lifetime of every component with capacity
+    of the solved network n, in the units of the model
+    """
+    capacities = []
+    for component, capacity in CAPACITY_ATTRIBUTES.items():
+        static = n.static(component)
+        for name in static.index:
+            capacities.append({'component': component, 'name': name,
+                               'capacity': float(static.at[name, capacity + '_opt']),
+                               'extendable': bool(static.at[name, capacity + '_extendable']),
+                               'capital_cost': float(static.at[name, 'capital_cost']),
+                               'lifetime': float(static.at[name, 'lifetime'])})
+    return capacities
+
+
+def update_carried(carried, capacities, year, nyears):
+    """
+    Return the list of carried capacities with the new builds of a period added
+    capacities: result of installed_capacities for the period
+    nyears: length of the period time window in years, capital costs are per time window
+    """
+    carried = list(carried)
+    for entry in capacities:
+        if entry['extendable'] and entry['capacity'] > MIN_CARRIED_CAPACITY:
+            carried.append({'component': entry['component'], 'name': entry['name'], 'build_year': year,
+                            'lifetime': entry['lifetime'], 'capacity': entry['capacity'],
+                            'annual_capital_cost': entry['capital_cost'] / nyears})
+    return carried
+
+
+def is_retired(entry, year):
+    """
+    Return True if a carried capacity has reached the end of its lifetime in the period of year
+    """
+    return year >= entry['build_year'] + entry['lifetime']
+
+
+def model_structure(case_dict, component_list):
+    """
+    Return the components and the time window of a period, periods with the same structure have optimization
+    models of the same size
+    """
+    length = pd.Timestamp(str(case_dict['datetime_end'])) - pd.Timestamp(str(case_dict['datetime_start']))
+    components = sorted((component_dict['component'], component_dict['name']) for component_dict in component_list)
+    return components, length, case_dict.get('delta_t'), case_dict.get('no_time_steps')
+
+
+def carried_component(template, entry, nyears):
+    """
+    Return component dictionary of a carried capacity with fixed capacity, from the component dictionary
+    it was built as (read from the case file for the current period)
+    """
+    capacity = CAPACITY_ATTRIBUTES[entry['component']]
+    component_dict = {attr: value for attr, value in template.items()
+                      if attr not in [capacity, capacity + '_min', capacity + '_max', capacity + '_extendable']}
+    component_dict.setdefault('carrier', template['name'])
+    component_dict['name'] = '{0}-{1}'.format(entry['name'], entry['build_year'])
+    component_dict[capacity] = entry['capacity']
+    # Capital cost at the time of the build, for the time window of the current period
+    component_dict['capital_cost'] = entry['annual_capital_cost'] * nyears
+    component_dict['build_year'] = entry['build_year']
+    if is_number(entry['lifetime']) and np.isfinite(float(entry['lifetime'])):
+        component_dict['lifetime'] = entry['lifetime']
+    return component_dict
@@ -0,0 +1,71 @@
+"""
+Pipelined execution of a batch of cases
+
+Every stage (e.g. build, solve, write) runs in its own thread and takes the cases from a bounded queue filled by
+the previous stage, so that the stages of consecutive cases overlap: while case N is solved, case N+1 is built
+and the results of case N-1 are written. The queues between the stages hold at most queue_size cases, which
+limits the number of networks in memory to the number of stages plus the queued cases.
+A case that fails in one stage is reported with the stage and error and is not passed to the following stages.
+"""
+import queue, logging, threading, time
+
+
+# Marks the end of the cases in a queue
+END_OF_CASES = object()
+
+
+def stage_worker(name, function, inbox, outbox, results):
+    """
+    Apply function to every (position, item) from inbox and put the returned item into outbox
+    until the end marker is received. Failures are recorded in results[position].
+    """
+    while True:
+        entry = inbox.get()
+        if entry is END_OF_CASES:
+            if outbox is not None:
+                outbox.put(END_OF_CASES)
+            return
+        position, item = entry
+        start_time = time.time()
+        try:
+            item = function(item)
+        except (Exception, SystemExit) as e:
+            # Input errors exit with sys.exit, show traceback only for unexpected errors
+            logging.error("Case {0} failed in stage {1}: {2!r}".format(results[position]['case'], name, e),
+                          exc_info=not isinstance(e, SystemExit))
+            results[position].update(status='failed', stage=name, error=repr(e))
+            continue
+        finally:
+            results[position]['timings'][name] = time.time() - start_time
+        if outbox is not None:
+            outbox.put((position, item))
+        else:
+            results[position].update(status='complete', result=item)
+
+
+def run_pipeline(cases, stages, queue_size=1):
+    """
+    Run every case through the stages, each stage in its own thread, keeping the order of the cases in every stage.
+    cases: list of inputs of the first stage, e.g. case file names
+    stages: list of (stage name, function), each function takes the result of the previous stage
+    queue_size: number of cases waiting between two stages
+    Return list with a dictionary per case: case, status ('complete' or 'failed'), stage and error of a failure,
+    result of the last stage and timings of the stages.
+    """
+    results = [{'case': case, 'status': 'pending', 'stage': None, 'error': None, 'result': None, 'timings': {}}
+               for case in cases]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads = []
+    for i, (name, function) in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        thread = threading.Thread(target=stage_worker, args=(name, function, queues[i], outbox, results),
+                                  name='pipeline-' + name, daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    for position, case in enumerate(cases):
+        queues[0].put((position, case))
+    queues[0].put(END_OF_CASES)
+    for thread in threads:
+        thread.join()
+    return results
@@ -4,13 +4,20 @@ Utility functions for process_input
 import numpy as np
 import logging
 import pypsa
-from utilities.load_costs import load_costs
+from utilities.cost_database import case_costs, parse_db_reference, resolve_db_references, missing_values_message
 from utilities.utilities import is_number, remove_empty_rows, find_first_row_with_keyword, check_attributes, concatenate_list_of_strings, get_nyears
+from utilities.time_series_store import is_time_series_reference
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 from sys import exit
 
+# Keywords in CASE_DATA that every case file must define
+REQUIRED_CASE_DATA = ['input_path', 'costs_path', 'output_path', 'case_name', 'filename_prefix', 'datetime_start',
+                      'datetime_end', 'total_hours', 'solver', 'logging_level', 'numerics_scaling', 'time_unit', 'power_unit', 'currency',
+                      'delta_t', 'no_time_steps']
+# Keywords in REQUIRED_CASE_DATA whose value may be left blank
+BLANK_CASE_DATA = ['delta_t', 'no_time_steps']
 
 def read_pypsa_input_file(file_name):
     """ file_name: str, case file path 
@@ -122,56 +129,39 @@ def define_special_attributes(comp, attr):
     return use_attr
 
 
-def read_component_data(comp_dict, attr, val, technology, costs_df):
+def report_input_error(message, problems=None):
+    """
+    Collect message in the problems list if given, else log it as terminal error and exit
+    """
+    if problems is not None:
+        problems.append(message)
+    else:
+        logging.error(message)
+        logging.error('Terminal error. Exiting.')
+        exit()
+
+
+def read_component_data(comp_dict, attr, val, technology, db_references, problems=None):
     """
     Read in one row of component data and update the comp_dict
+    Database values are collected in db_references and resolved for all components with resolve_db_references
+    If a problems list is given, errors are collected in it instead of exiting
     """
-    factor = 1
     # if value is a number or name, read that.
-    # if it's empty or a cost name, use read_attr to get the value from the costs dataframe.
+    # if it's a cost name, collect it to get the value from the costs dataframe.
     if attr != None:
-        read_attr = None
         # if "name", "bus" or "carrier" is in attr or value can be converted to a float, use that
-        if (val != None and (any(x in attr for x in ['name', 'bus', 'carrier']) or is_number(val) or '=' in val or '.csv' in val)):
+        if (val != None and (any(x in attr for x in ['name', 'bus', 'carrier']) or is_number(val) or '=' in val or is_time_series_reference(val))):
             comp_dict[attr] = val
         # if otherwise value is a string, use database value if the string is just 'db'
         # if first two letters are db use the rest of the string as the attribute name
         # if there is a '*' in the string, use the value before the '*' as a factor to multiply the database value
         elif type(val) is str:
             if 'db' in val:
-                if val == 'db':
-                    read_attr = attr
-                elif '*' in val:
-                    factor = float(val.split('*')[0])
-                    val = val.split('*')[1].replace('db_','')
-                    read_attr = val
-                else:
-                    val = val.replace('db_','')
-                    read_attr = val
-            else:
-                logging.error('Tried to read in a string that is not a number, name, or contains "db" to indicate use a database value. Failed = '+val + ' for attribute ' + attr + ' for component ' + comp_dict["component"] + ' ' + comp_dict["name"])
-                logging.error('Terminal error. Exiting.')
-                exit()
-
-
-        # if read_attr is defined, use it to get the value from the costs dataframe
-        if read_attr != None:
-            if (technology in costs_df.index and read_attr in costs_df.columns):
-                comp_dict[attr] = costs_df.loc[technology, read_attr] * factor
-                logging.info('Using technology database value for ' + comp_dict["component"] + ' "' + comp_dict["name"] + '" for ' + attr
-                                + ' = ' + str(comp_dict[attr]) + ' for technology ' + technology)   
-            elif (technology not in costs_df.index and read_attr in costs_df.columns):
-                logging.error('Technology ' + technology + ' not in database. Trying to use database value for ' + read_attr + '.')
-                logging.error('Terminal error. Exiting.')
-                exit() 
-            elif (technology in costs_df.index and read_attr not in costs_df.columns):
-                logging.error('Attribute ' + read_attr + ' does not have a database value for technology ' + technology + '.')
-                logging.error('Terminal error. Exiting.')
-                exit()
+                read_attr, factor = parse_db_reference(attr, val)
+                db_references.append((comp_dict, attr, technology, read_attr, factor))
             else:
-                logging.error('Technology ' + technology + ' not in database and attribute ' + read_attr + ' does not have a database value for technology ' + technology + '.')
-                logging.error('Terminal error. Exiting.')
-                exit()
+                report_input_error('Tried to read in a string that is not a number, name, or contains "db" to indicate use a database value. Failed = '+val + ' for attribute ' + attr + ' for component ' + comp_dict["component"] + ' ' + comp_dict["name"], problems)
 
     return comp_dict
 
@@ -199,9 +189,12 @@ def convert_slash_to_dash_dates(s):
     return ' '.join(parts)
 
 
-def read_input_file_to_dict(file_name):
+def read_input_file_to_dict(file_name, problems=None, overrides=None, cache=None):
     """"
     file_name:  str, case file 
+    problems: optional list, if given errors in the case file are collected in it instead of exiting
+    overrides: optional dictionary of CASE_DATA values that replace those in the case file (e.g. for a pathway period)
+    cache: optional dictionary to reuse cost tables loaded for earlier cases
     Code to read in an excel or csv case file
     return a dictionary from the CASE_DATA section: 
         case_data_dict: keys: col A, values: col B
@@ -224,6 +217,14 @@ def read_input_file_to_dict(file_name):
     case_data_dict = {}
     for row in case_data:
         case_data_dict[row[0]] = row[1]
+    if overrides:
+        case_data_dict.update(overrides)
+
+    missing_keywords = [key for key in REQUIRED_CASE_DATA
+                        if key not in case_data_dict or (case_data_dict[key] is None and key not in BLANK_CASE_DATA)]
+    if missing_keywords:
+        report_input_error('Case data is missing required keywords: ' + ', '.join(missing_keywords), problems)
+        return None
 
     # Set logging level
     logging.basicConfig(level=case_data_dict["logging_level"].upper())
@@ -253,7 +254,13 @@ def read_input_file_to_dict(file_name):
         logging.error('Current directory is not table_pypsa and table_pypsa directory is not in current directory.')
 
     # Load PyPSA costs
-    costs = load_costs(tech_costs=case_data_dict["costs_path"], config=config_file_path, Nyears=nyears)
+    try:
+        costs = case_costs(case_data_dict, config_file_path, nyears, cache)
+    except Exception as e:
+        if problems is None:
+            raise
+        problems.append('Could not load costs from costs_path ' + str(case_data_dict["costs_path"]) + ': ' + str(e))
+        return None
 
     # create list of dictionaries of component data
     attributes = component_data[0] 
@@ -266,9 +273,14 @@ def read_input_file_to_dict(file_name):
     component_attribute_dictionary = update_component_attribute_dict(attributes[1:])
     good,bad_list = check_attributes(attributes[1:], component_attribute_dictionary)
     if(good == False):
-        logging.error('Attributes in component_data must be in the list of allowable attributes for the component type. Failed = '+concatenate_list_of_strings(bad_list))
+        message = 'Attributes in component_data must be in the list of allowable attributes for the component type. Failed = '+concatenate_list_of_strings(bad_list)
+        if problems is not None:
+            problems.append(message)
+        else:
+            logging.error(message)
         return None
     component_data_list = []
+    db_references = []
     for row in component_data[1:]:
         component_data_dict = {}
         component = row[0]
@@ -277,6 +289,9 @@ def read_input_file_to_dict(file_name):
                 logging.info('Skipping commented out component: '+component)
                 continue
             logging.error('Component type in component_data must be in the list of allowable component types. Failed = '+component)
+            if problems is not None:
+                problems.append('Component type in component_data must be in the list of allowable component types. Failed = '+component)
+                continue
         component_data_dict['component'] = component
         component_data_dict['name'] = row[1]
         # Read in technology name before additional specifications following % and remove space at end
@@ -289,7 +304,12 @@ def read_input_file_to_dict(file_name):
             attribute = use_attributes[i]
             value = row[i]
             if attribute in component_attribute_dictionary[component].index:
-                component_data_dict = read_component_data(component_data_dict, attribute, value, tech_name, costs)
+                component_data_dict = read_component_data(component_data_dict, attribute, value, tech_name, db_references, problems)
 
         component_data_list.append(component_data_dict)
+
+    # Look up all database values at once and report all missing ones together
+    missing = resolve_db_references(db_references, costs)
+    if missing:
+        report_input_error(missing_values_message(missing, costs), problems)
     return case_data_dict, component_data_list, component_attribute_dictionary
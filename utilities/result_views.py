@@ -0,0 +1,104 @@
+"""
+Aggregated views of the time results: duration curves, monthly and seasonal energy and average diurnal profiles
+
+The views are computed in vectorized passes over the power time series of generators, storage units, stores,
+links and loads, and are small enough to be written as extra sheets of the results workbook also for multi-year
+runs. Columns are named as in the 'time results' sheet, the power of stores as that of storage units.
+Monthly, seasonal and diurnal views need dates as snapshots, i.e. at least one time series file in the case.
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+
+# Points of the duration curves, share of the time in which the value is exceeded
+DURATION_STEPS = np.linspace(0., 100., 101)
+# Meteorological seasons by month
+SEASONS = {12: 'DJF', 1: 'DJF', 2: 'DJF', 3: 'MAM', 4: 'MAM', 5: 'MAM',
+           6: 'JJA', 7: 'JJA', 8: 'JJA', 9: 'SON', 10: 'SON', 11: 'SON'}
+# Power time series of the views as (component list name, attribute, column suffix, part of the series).
+# The net power of stores is split like the power of storage units, into its negative part (charged)
+# and its positive part (discharged).
+POWER_SERIES = [('generators', 'p', 'dispatch', None), ('loads', 'p', 'load', None),
+                ('storage_units', 'p_store', 'charged', None), ('storage_units', 'p_dispatch', 'discharged', None),
+                ('stores', 'p', 'charged', 'negative'), ('stores', 'p', 'discharged', 'positive'),
+                ('links', 'p0', 'dispatch', None)]
+
+
+def power_time_series(n, scaling_factor=1.):
+    """
+    Return dataframe of all power time series of the solved network, divided by scaling_factor
+    """
+    frames = []
+    for list_name, attr, suffix, part in POWER_SERIES:
+        df = getattr(n, list_name + '_t')[attr]
+        if df.empty:
+            continue
+        if part == 'positive':
+            df = df.clip(lower=0.)
+        elif part == 'negative':
+            df = (-df).clip(lower=0.)
+        frames.append(df.add_suffix(' ' + suffix))
+    if not frames:
+        return pd.DataFrame(index=n.snapshots)
+    return pd.concat(frames, axis=1) / scaling_factor
+
+
+def duration_curves(power):
+    """
+    Return dataframe of the duration curves of all columns, sorted from the highest to the lowest value,
+    at the shares of time in DURATION_STEPS
+    """
+    values = -np.sort(-power.to_numpy(dtype=float), axis=0)
+    positions = np.round(DURATION_STEPS / 100. * (len(values) - 1)).astype(int)
+    df = pd.DataFrame(values[positions], index=pd.Index(DURATION_STEPS, name='time exceeded [%]'), columns=power.columns)
+    return df
+
+
+def monthly_energy(energy):
+    """
+    Return dataframe of the energy per month from a dataframe of energy per snapshot
+    """
+    df = energy.groupby([energy.index.year, energy.index.month]).sum()
+    df.index.names = ['year', 'month']
+    return df
+
+
+def seasonal_energy(energy):
+    """
+    Return dataframe of the energy per season of each year from a dataframe of energy per snapshot.
+    December belongs to DJF of the following year, so that every DJF is one winter.
+    """
+    seasons = energy.index.month.map(SEASONS)
+    years = energy.index.year + (energy.index.month == 12)
+    df = energy.groupby([years, seasons]).sum()
+    df.index.names = ['year', 'season']
+    # Order seasons within a year as they occur instead of alphabetically
+    order = {season: i for i, season in enumerate(['DJF', 'MAM', 'JJA', 'SON'])}
+    return df.sort_index(key=lambda index: index.map(order) if index.name == 'season' else index)
+
+
+def diurnal_profiles(power):
+    """
+    Return dataframe of the average power by hour of the day
+    """
+    df = power.groupby(power.index.hour).mean()
+    df.index.name = 'hour'
+    return df
+
+
+def result_views(n, case_dict):
+    """
+    Return dictionary of sheet name to dataframe of the aggregated views of the solved network n,
+    in the units of the input file
+    """
+    power = power_time_series(n, float(case_dict['numerics_scaling']))
+    views = {'duration curves': duration_curves(power)}
+    if not isinstance(power.index, pd.DatetimeIndex):
+        logging.info("Snapshots are not dates, monthly, seasonal and diurnal views are not computed.")
+        return views
+    energy = power.multiply(n.snapshot_weightings.generators, axis=0)
+    views['monthly energy'] = monthly_energy(energy)
+    views['seasonal energy'] = seasonal_energy(energy)
+    views['diurnal profiles'] = diurnal_profiles(power)
+    return views
@@ -0,0 +1,249 @@
+"""
+Shared results store that collects the results of many runs in one place
+
+Each run appends its 'case results', 'component results', numeric component inputs and optionally
+downsampled 'time results' as long-format tables keyed by run_id and case_name.
+Every run has one row in the 'runs' table, its scalar case data are kept in the long 'parameters' table,
+with one row per keyword, that can be joined on run_id.
+
+Two backends are supported, chosen by the store path:
+    - path ending with .sqlite, .sqlite3 or .db: a single SQLite file (standard library only)
+    - any other path: a Parquet dataset directory partitioned by case_name (requires pyarrow)
+"""
+import os, uuid, sqlite3, logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utilities.utilities import check_directory
+
+
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+STORE_TABLES = ['runs', 'parameters', 'case results', 'component results', 'component inputs', 'time results']
+# Seconds to wait for other writers to release a locked SQLite file
+SQLITE_TIMEOUT = 600
+
+
+def is_sqlite_store(store_path):
+    """
+    Return True if the store path points to an SQLite file, False for a Parquet dataset directory
+    """
+    return str(store_path).lower().endswith(SQLITE_EXTENSIONS)
+
+
+def table_name(table):
+    """
+    Return the table or directory name used in the store for a results sheet name
+    """
+    return table.replace(' ', '_')
+
+
+def case_parameters(case_dict):
+    """
+    Return the scalar entries of the case data dictionary as a JSON serializable dictionary
+    """
+    parameters = {}
+    for key, value in case_dict.items():
+        # Skip note rows without keyword
+        if not isinstance(key, str):
+            continue
+        if isinstance(value, (bool, np.bool_)):
+            parameters[key] = bool(value)
+        elif isinstance(value, (int, float, np.integer, np.floating)):
+            parameters[key] = float(value) if isinstance(value, (float, np.floating)) else int(value)
+        elif isinstance(value, str) or value is None:
+            parameters[key] = value
+    return parameters
+
+
+def tidy_case_parameters(case_dict):
+    """
+    Return the scalar case data as a long dataframe with columns parameter, value (numbers and booleans, NaN for text)
+    and text (every value as text, None if the value is blank)
+    """
+    rows = []
+    for key, value in case_parameters(case_dict).items():
+        number = float(value) if isinstance(value, (bool, int, float)) else np.nan
+        rows.append([key, number, str(value) if value is not None else None])
+    return pd.DataFrame(rows, columns=['parameter', 'value', 'text'])
+
+
+def tidy_case_results(case_results_df):
+    """
+    Return case results as a long dataframe with columns variable, value
+    """
+    tidy = case_results_df.iloc[0].rename_axis('variable').reset_index(name='value')
+    tidy['value'] = pd.to_numeric(tidy['value'], errors='coerce')
+    return tidy
+
+
+def tidy_component_results(statistics_df):
+    """
+    Return component results as a long dataframe with columns component, name, carrier, variable, value
+    """
+    stats = statistics_df.copy()
+    stats.index = stats.index.set_names(['component', 'name'])
+    stats = stats.reset_index()
+    tidy = stats.melt(id_vars=['component', 'name', 'carrier'], var_name='variable', value_name='value')
+    tidy['value'] = pd.to_numeric(tidy['value'], errors='coerce')
+    return tidy
+
+
+def tidy_component_inputs(component_list):
+    """
+    Return the numeric component inputs as a long dataframe with columns component, name, attribute, value
+    """
+    rows = []
+    for component_dict in component_list:
+        for attr, value in component_dict.items():
+            if isinstance(value, (bool, np.bool_)):
+                value = float(value)
+            if isinstance(value, (int, float, np.integer, np.floating)):
+                rows.append([component_dict['component'], component_dict['name'], attr, float(value)])
+    return pd.DataFrame(rows, columns=['component', 'name', 'attribute', 'value'])
+
+
+def tidy_time_results(time_results_df, time_resolution):
+    """
+    Return time results downsampled to time_resolution (pandas offset alias, e.g. 'D') as a long dataframe
+    with columns snapshot, variable, value. Snapshots without datetime index are averaged in blocks of
+    time_resolution time steps if time_resolution is an integer.
+    """
+    if isinstance(time_results_df.index, pd.DatetimeIndex):
+        downsampled = time_results_df.resample(time_resolution).mean()
+    else:
+        steps = int(time_resolution)
+        downsampled = time_results_df.groupby(np.arange(len(time_results_df)) // steps).mean()
+    downsampled.index.name = 'snapshot'
+    tidy = downsampled.reset_index().melt(id_vars='snapshot', var_name='variable', value_name='value')
+    tidy['snapshot'] = tidy['snapshot'].astype(str)
+    return tidy
+
+
+def collect_store_tables(run_id, case_dict, component_list, df_dict, infile=None, time_resolution=None):
+    """
+    Return dictionary of long-format tables of one run keyed by store table name
+    """
+    run_df = pd.DataFrame([{
+        'case_name': case_dict['case_name'],
+        'filename_prefix': case_dict['filename_prefix'],
+        'input_file': infile,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+    }])
+    tables = {
+        'runs': run_df,
+        'parameters': tidy_case_parameters(case_dict),
+        'case results': tidy_case_results(df_dict['case results']),
+        'component results': tidy_component_results(df_dict['component results']),
+        'component inputs': tidy_component_inputs(component_list),
+    }
+    if time_resolution is not None and 'time results' in df_dict:
+        tables['time results'] = tidy_time_results(df_dict['time results'], time_resolution)
+
+    # Key every row by run id and case name
+    for table in tables:
+        if table != 'runs':
+            tables[table].insert(0, 'case_name', case_dict['case_name'])
+        tables[table].insert(0, 'run_id', run_id)
+    return tables
+
+
+def sqlite_column_type(dtype):
+    """
+    Return the SQLite column type of a pandas dtype
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def insert_table(conn, table, df):
+    """
+    Create the table if it does not exist and insert the rows of df, within the open transaction of conn
+    """
+    columns = ', '.join('"{0}" {1}'.format(col, sqlite_column_type(dtype)) for col, dtype in df.dtypes.items())
+    conn.execute('CREATE TABLE IF NOT EXISTS "{0}" ({1})'.format(table_name(table), columns))
+    # Python objects with None for missing values, as the sqlite3 module can not bind numpy types
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    conn.executemany('INSERT INTO "{0}" ({1}) VALUES ({2})'.format(
+        table_name(table), ', '.join('"{0}"'.format(col) for col in df.columns), ', '.join('?' * len(df.columns))), rows)
+
+
+def write_tables_to_sqlite(store_path, tables):
+    """
+    Append tables to an SQLite store in one transaction. Concurrent writers wait for the file lock.
+    """
+    check_directory(os.path.dirname(os.path.abspath(store_path)))
+    # Transactions are started and ended explicitly
+    conn = sqlite3.connect(store_path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+    try:
+        # Take the write lock up front so that all tables of a run are appended atomically
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for table, df in tables.items():
+                insert_table(conn, table, df)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+
+def write_tables_to_parquet(store_path, tables):
+    """
+    Write tables to a Parquet dataset partitioned by case_name. Every run writes its own file,
+    which is moved into place once complete, so concurrent writers never touch the same file.
+    """
+    for table, df in tables.items():
+        case_name = df['case_name'].iloc[0]
+        partition = os.path.join(store_path, table_name(table), 'case_name={0}'.format(case_name))
+        check_directory(partition)
+        run_file = os.path.join(partition, '{0}.parquet'.format(df['run_id'].iloc[0]))
+        # Hidden temporary file, ignored by readers of the dataset until it is renamed
+        tmp_file = os.path.join(partition, '.{0}.parquet.tmp'.format(df['run_id'].iloc[0]))
+        # case_name is encoded in the partition directory
+        df.drop(columns='case_name').to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, run_file)
+
+
+def write_results_to_store(store_path, case_dict, component_list, df_dict, infile=None, time_resolution=None, run_id=None):
+    """
+    Append the results of one run to the results store at store_path and return the run id
+    """
+    run_id = run_id if run_id is not None else uuid.uuid4().hex
+    tables = collect_store_tables(run_id, case_dict, component_list, df_dict, infile, time_resolution)
+    if is_sqlite_store(store_path):
+        write_tables_to_sqlite(store_path, tables)
+    else:
+        write_tables_to_parquet(store_path, tables)
+    logging.info("Results of run {0} appended to results store: {1}".format(run_id, store_path))
+    return run_id
+
+
+def read_results_store(store_path, table, case_name=None):
+    """
+    Read one table ('runs', 'parameters', 'case results', 'component results', 'component inputs' or 'time results')
+    from the results store into a dataframe, optionally only for one case_name
+    """
+    if table not in STORE_TABLES:
+        raise ValueError('Unknown results store table: {0}. Choose from {1}'.format(table, STORE_TABLES))
+    if is_sqlite_store(store_path):
+        conn = sqlite3.connect(store_path, timeout=SQLITE_TIMEOUT)
+        try:
+            query = 'SELECT * FROM "{0}"'.format(table_name(table))
+            if case_name is None:
+                return pd.read_sql_query(query, conn)
+            return pd.read_sql_query(query + ' WHERE case_name = ?', conn, params=(case_name,))
+        finally:
+            conn.close()
+
+    table_path = os.path.join(store_path, table_name(table))
+    if not os.path.isdir(table_path):
+        return pd.DataFrame()
+    filters = [('case_name', '=', case_name)] if case_name is not None else None
+    df = pd.read_parquet(table_path, filters=filters)
+    # Partition column is read as categorical at the end, move it next to run_id
+    df.insert(1, 'case_name', df.pop('case_name').astype(str))
+    return df
@@ -0,0 +1,184 @@
+"""
+Run state tracking for batch runs
+
+For every case a small JSON manifest is kept next to its output files (<filename_prefix>.manifest.json).
+It records the hashes of all inputs, the last stage that was completed (built, solved, written),
+the solver status and the time spent in each stage. With this information a batch run can be resumed,
+skipping cases that are complete and whose inputs did not change.
+"""
+import os, json, uuid, pickle, hashlib, logging
+from datetime import datetime
+from urllib.parse import urlparse
+from urllib.request import urlopen
+from utilities.utilities import get_output_filename
+from utilities.cost_database import case_cost_files
+from utilities.pathway import pathway_periods_path
+from utilities.time_series_store import is_time_series_reference, is_time_series_store, split_store_path
+
+
+STAGES = ['built', 'solved', 'written']
+# Schemes of input files that are downloaded to hash their content
+URL_SCHEMES = ['http', 'https', 'ftp']
+# Seconds to wait for the download of an input file given as URL
+URL_TIMEOUT = 60
+
+
+def hash_file(path):
+    """
+    Return sha256 hash of the content of a file. Files given as URL (e.g. costs from the technology database)
+    are downloaded and their content is hashed, if the download fails the hash is unique, so that a run with
+    this file is never skipped. Other paths that are not local files are hashed as path.
+    """
+    sha = hashlib.sha256()
+    if urlparse(str(path)).scheme in URL_SCHEMES:
+        try:
+            with urlopen(str(path), timeout=URL_TIMEOUT) as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+        except (OSError, ValueError) as e:
+            logging.warning("Could not download {0} to hash its content, its case is not skipped on resume: {1}".format(path, e))
+            sha.update(uuid.uuid4().bytes)
+        return sha.hexdigest()
+    if not os.path.isfile(path):
+        sha.update(str(path).encode())
+        return sha.hexdigest()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def input_hashes(infile, case_dict, component_list):
+    """
+    Return dictionary of hashes of the case file, the costs file(s) and all time series files of a case
+    """
+    files = {'case file': infile}
+    if '{year}' in str(case_dict['costs_path']):
+        # Costs interpolated between the files of two years, the year itself is hashed as a path
+        files.update({'costs ' + path: path for path in case_cost_files(case_dict)})
+        files['costs year'] = 'costs_year={0}'.format(case_dict['costs_year'])
+    else:
+        files['costs'] = case_dict['costs_path']
+    if case_dict.get('pathway_periods'):
+        # Case data of a pathway period is partly given in the periods file
+        files['pathway periods'] = pathway_periods_path(case_dict)
+    for component_dict in component_list:
+        for attr, value in component_dict.items():
+            if is_time_series_reference(value):
+                file_name = value.split("*")[1] if "*" in value else value
+                files[file_name] = os.path.join(case_dict['input_path'], file_name)
+                # Stores are rewritten completely on conversion, so their meta data identifies the content
+                if is_time_series_store(file_name):
+                    files[file_name] = os.path.join(split_store_path(files[file_name])[0], 'meta.json')
+    return {key: hash_file(path) for key, path in sorted(files.items())}
+
+
+def manifest_path(case_dict):
+    """
+    Return path of the manifest file of a case
+    """
+    return get_output_filename(case_dict) + ".manifest.json"
+
+
+def checkpoint_path(case_dict):
+    """
+    Return path of the checkpoint file with the solved network of a case
+    """
+    return get_output_filename(case_dict) + ".checkpoint.pickle"
+
+
+def output_paths(case_dict):
+    """
+    Return paths of the result files written by write_result for a case
+    """
+    output_file = get_output_filename(case_dict)
+    return [output_file + ".xlsx", output_file + ".pickle"]
+
+
+def read_manifest(case_dict):
+    """
+    Return the manifest of a case as dictionary, or None if there is none
+    """
+    path = manifest_path(case_dict)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        logging.warning("Could not read manifest {0}, ignoring it.".format(path))
+        return None
+
+
+def write_manifest(case_dict, manifest):
+    """
+    Write the manifest of a case, replacing the previous one atomically
+    """
+    path = manifest_path(case_dict)
+    manifest['updated'] = datetime.now().isoformat(timespec='seconds')
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def new_manifest(infile, hashes):
+    """
+    Return an empty manifest for a case that has not completed any stage
+    """
+    return {'input_file': infile, 'input_hashes': hashes, 'stage': None, 'status': 'running',
+            'solver_status': None, 'termination_condition': None, 'timings': {}, 'error': None}
+
+
+def update_manifest(case_dict, manifest, **kwargs):
+    """
+    Update entries of the manifest of a case and write it
+    """
+    manifest.update(kwargs)
+    write_manifest(case_dict, manifest)
+    return manifest
+
+
+def completed_stage(manifest, hashes):
+    """
+    Return the last completed stage recorded in a manifest whose outputs are still usable,
+    or None if the case has to be run from the start
+    """
+    if manifest is None or manifest.get('input_hashes') != hashes:
+        return None
+    return manifest.get('stage')
+
+
+def outputs_complete(case_dict):
+    """
+    Return True if all result files of a case exist
+    """
+    return all(os.path.exists(path) for path in output_paths(case_dict))
+
+
+def save_checkpoint(network, case_dict, component_list):
+    """
+    Save the solved network together with the case and component data, so results can be
+    postprocessed again without solving
+    """
+    path = checkpoint_path(case_dict)
+    # The optimization model is not needed for postprocessing and can not be pickled
+    model = getattr(network, 'model', None)
+    network.model = None
+    try:
+        with open(path + ".tmp", 'wb') as f:
+            pickle.dump({'network': network, 'case_dict': case_dict, 'component_list': component_list}, f)
+    finally:
+        network.model = model
+    os.replace(path + ".tmp", path)
+    logging.info("Solved network checkpoint written to file: " + path)
+    return path
+
+
+def load_checkpoint(case_dict):
+    """
+    Return the network, case dictionary and component list saved in the checkpoint of a case
+    """
+    with open(checkpoint_path(case_dict), 'rb') as f:
+        checkpoint = pickle.load(f)
+    return checkpoint['network'], checkpoint['case_dict'], checkpoint['component_list']
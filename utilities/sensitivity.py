@@ -0,0 +1,235 @@
+"""
+First-order sensitivities of the objective from the solved linear optimization model
+
+By the envelope theorem the derivative of the optimal objective with respect to a cost coefficient is the
+optimal value of its variable, and the derivative with respect to the right hand side of a constraint is its
+dual value. This gives the response of the objective to small changes of the capital cost, marginal cost and
+capacity bounds of every component from one solve. Where the solver provides ranging (HiGHS, Gurobi), the
+ranges of the capital cost and capacity bounds in which the optimal basis stays the same are added.
+Rows of aggregated components are split back onto the original components.
+"""
+import logging
+import numpy as np
+import pandas as pd
+from utilities.aggregation import member_split
+
+
+# Capacity variable and dispatch variable that marginal_cost applies to, for components with capacity
+CAPACITY_ATTRIBUTES = {'Generator': 'p_nom', 'Link': 'p_nom', 'StorageUnit': 'p_nom', 'Store': 'e_nom'}
+DISPATCH_ATTRIBUTES = {'Generator': 'p', 'Link': 'p0', 'StorageUnit': 'p_dispatch', 'Store': 'p'}
+SENSITIVITY_COLUMNS = ['carrier', 'capital_cost', 'marginal_cost', 'optimal capacity',
+                       'd objective / d capital_cost', 'd objective / d marginal_cost', 'd objective / d capacity',
+                       'd objective / d capacity min', 'd objective / d capacity max', 'capacity reduced cost',
+                       'capital_cost range low', 'capital_cost range high', 'capacity min range low',
+                       'capacity min range high', 'capacity max range low', 'capacity max range high']
+
+
+def constraint_values(m, name, attr):
+    """
+    Return pandas object of an attribute (dual, rhs, labels) of a constraint of the model, or None if it does not exist
+    """
+    if name not in m.constraints:
+        return None
+    values = getattr(m.constraints[name], attr)
+    return values.to_pandas()
+
+
+def reduced_costs(m):
+    """
+    Return series of the reduced costs c - A^T y of all variables indexed by variable label
+    """
+    matrices = m.matrices
+    dual = np.nan_to_num(matrices.dual)
+    return pd.Series(matrices.c - matrices.A.T @ dual, index=matrices.vlabels)
+
+
+def solver_ranging(m):
+    """
+    Return (cost ranges of variables, bound ranges of constraints) as dataframes with columns low, high
+    indexed by variable and constraint label, or (None, None) if the solver does not provide ranging
+    """
+    solver_model = getattr(m, 'solver_model', None)
+    try:
+        if type(solver_model).__module__.startswith('highspy'):
+            status, ranging = solver_model.getRanging()
+            if not ranging.valid:
+                return None, None
+            lp = solver_model.getLp()
+            columns = [int(name[1:]) for name in lp.col_names_]
+            rows = [int(name[1:]) for name in lp.row_names_]
+            # Cost ranging also covers the slack columns of the rows after the structural columns
+            costs = pd.DataFrame({'low': ranging.col_cost_dn.value_[:len(columns)],
+                                  'high': ranging.col_cost_up.value_[:len(columns)]}, index=columns)
+            bounds = pd.DataFrame({'low': ranging.row_bound_dn.value_, 'high': ranging.row_bound_up.value_}, index=rows)
+            return costs, bounds
+        if type(solver_model).__module__.startswith('gurobipy'):
+            variables = solver_model.getVars()
+            constraints = solver_model.getConstrs()
+            columns = [int(v.VarName[1:]) for v in variables]
+            rows = [int(c.ConstrName[1:]) for c in constraints]
+            costs = pd.DataFrame({'low': solver_model.getAttr('SAObjLow', variables),
+                                  'high': solver_model.getAttr('SAObjUp', variables)}, index=columns)
+            bounds = pd.DataFrame({'low': solver_model.getAttr('SARHSLow', constraints),
+                                   'high': solver_model.getAttr('SARHSUp', constraints)}, index=rows)
+            return costs, bounds
+    except Exception as e:
+        # Ranging needs a basic solution, e.g. not available after barrier without crossover
+        logging.warning("Solver ranging not available: {0!r}".format(e))
+    return None, None
+
+
+def label_lookup(ranges, labels, column):
+    """
+    Return array of ranges[column] for model labels, NaN for masked labels (-1) or missing ranging
+    """
+    labels = np.asarray(labels, dtype=float)
+    if ranges is None:
+        return np.full(len(labels), np.nan)
+    values = ranges[column].reindex(labels[labels >= 0].astype(int)).to_numpy(dtype=float)
+    result = np.full(len(labels), np.nan)
+    result[labels >= 0] = values
+    return result
+
+
+def fixed_capacity_sensitivity(m, n, component, capacity):
+    """
+    Return series of d objective / d capacity of components with fixed capacity: the sum of the duals of their
+    fixed bound constraints times the derivative of the right hand side, which is proportional to the capacity
+    """
+    static = n.static(component)
+    fixed = static.index[~static[capacity + '_extendable']]
+    sensitivity = pd.Series(0., index=fixed)
+    for name in m.constraints:
+        if not name.startswith(component + '-fix-'):
+            continue
+        dual = m.constraints[name].dual
+        rhs = m.constraints[name].rhs
+        dims = [dim for dim in dual.dims if dim != component + '-fix']
+        contribution = (dual.fillna(0) * rhs).sum(dims).to_pandas()
+        sensitivity = sensitivity.add(contribution.reindex(fixed).fillna(0), fill_value=0)
+    # The right hand side is zero without capacity, the derivative can not be recovered from it
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sensitivity = sensitivity / static.loc[fixed, capacity].where(static.loc[fixed, capacity] != 0)
+    return sensitivity
+
+
+def component_sensitivities(m, n, component, cost_ranges, bound_ranges, reduced_cost):
+    """
+    Return dataframe with the sensitivities of the objective for all components of one type
+    """
+    static = n.static(component)
+    if static.empty:
+        return None
+    capacity = CAPACITY_ATTRIBUTES[component]
+    extendable = static[capacity + '_extendable']
+    weights = n.snapshot_weightings.objective
+    dispatch = n.dynamic(component)[DISPATCH_ATTRIBUTES[component]].reindex(columns=static.index, fill_value=0.)
+
+    df = pd.DataFrame(index=static.index, columns=SENSITIVITY_COLUMNS[1:], dtype=float)
+    df['capital_cost'] = static['capital_cost']
+    df['marginal_cost'] = static['marginal_cost'] if 'marginal_cost' in static else 0.
+    df['optimal capacity'] = static[capacity + '_opt']
+    # Capital costs are only part of the objective for extendable components
+    df['d objective / d capital_cost'] = static[capacity + '_opt'].where(extendable, 0.)
+    df['d objective / d marginal_cost'] = dispatch.multiply(weights, axis=0).sum()
+    df['d objective / d capacity'] = fixed_capacity_sensitivity(m, n, component, capacity)
+
+    ext = static.index[extendable]
+    variable_labels = m.variables[component + '-' + capacity].labels.to_pandas().reindex(ext) \
+        if component + '-' + capacity in m.variables else pd.Series(-1, index=ext)
+    for bound, attr in [('lower', 'min'), ('upper', 'max')]:
+        name = '{0}-ext-{1}-{2}'.format(component, capacity, bound)
+        dual = constraint_values(m, name, 'dual')
+        labels = constraint_values(m, name, 'labels')
+        if dual is None:
+            continue
+        labels = labels.reindex(ext).fillna(-1)
+        active_dual = dual.reindex(ext).where(labels >= 0)
+        df.loc[ext, 'd objective / d capacity ' + attr] = active_dual
+        df.loc[ext, 'capacity {0} range low'.format(attr)] = label_lookup(bound_ranges, labels, 'low')
+        df.loc[ext, 'capacity {0} range high'.format(attr)] = label_lookup(bound_ranges, labels, 'high')
+        # Reduced cost of the capacity variable without its own bounds: how much the capital cost has to fall
+        # (positive) or may rise (negative) before the optimal capacity moves away from the bound
+        df.loc[ext, 'capacity reduced cost'] = df.loc[ext, 'capacity reduced cost'].fillna(0) + active_dual.fillna(0)
+    df.loc[ext, 'capacity reduced cost'] += reduced_cost.reindex(variable_labels.to_numpy()).fillna(0).to_numpy()
+    df.loc[ext, 'capital_cost range low'] = label_lookup(cost_ranges, variable_labels, 'low')
+    df.loc[ext, 'capital_cost range high'] = label_lookup(cost_ranges, variable_labels, 'high')
+
+    df.insert(0, 'carrier', static['carrier'])
+    df.index = pd.MultiIndex.from_product([[component], df.index])
+    return df
+
+
+def capacity_scaling(n, component, names, scaling_factor):
+    """
+    Return series with the factor by which capacities are scaled in the model: numerics_scaling, except for
+    generators with p_max_pu time series, which are scaled through the time series instead
+    """
+    scale = pd.Series(scaling_factor, index=names, dtype=float)
+    if component == 'Generator':
+        scale[names.isin(n.generators_t.p_max_pu.columns)] = 1.
+    return scale
+
+
+def disaggregate_sensitivities(df, aggregation, scale):
+    """
+    Return sensitivities with the row of every aggregated component replaced by rows of its original components
+    scale: series of the capacity scaling of every row
+    Capacities, capital cost and dispatch derivatives are split like the optimal capacities and dispatch, the
+    derivative by a fixed capacity by the relative availability. Duals of the capacity bounds hold for the bounds
+    of every original component, as the aggregated bounds are their sums; the bound ranges are shifted by the
+    bounds of the other components.
+    """
+    for name, info in (aggregation or {}).items():
+        key = (info['component'], name)
+        if key not in df.index:
+            continue
+        row = df.loc[key]
+        capacities, share, availability = member_split(info, row['optimal capacity'] * scale[key])
+        capacities = capacities / scale[key]
+        ratios = capacities / row['optimal capacity'] if row['optimal capacity'] > 0 else np.zeros(len(capacities))
+        total_min = sum(member['min'] for member in info['members']) / scale[key]
+        total_max = sum(member['max'] if member['max'] is not None else np.inf for member in info['members']) / scale[key]
+        rows = []
+        for member, capacity, ratio, member_share, member_availability in zip(info['members'], capacities, ratios, share, availability):
+            member_row = row.copy()
+            member_row['optimal capacity'] = capacity
+            member_row['d objective / d capital_cost'] = row['d objective / d capital_cost'] * ratio
+            member_row['d objective / d marginal_cost'] = row['d objective / d marginal_cost'] * member_share
+            member_row['d objective / d capacity'] = row['d objective / d capacity'] * member_availability
+            member_max = member['max'] / scale[key] if member['max'] is not None else np.inf
+            for col in ['capacity min range low', 'capacity min range high']:
+                member_row[col] = row[col] - (total_min - member['min'] / scale[key])
+            for col in ['capacity max range low', 'capacity max range high']:
+                member_row[col] = row[col] - (total_max - member_max) if np.isfinite(total_max) else np.nan
+            rows.append(member_row.rename((info['component'], member['name'])))
+        position = df.index.get_loc(key)
+        df = pd.concat([df.iloc[:position], pd.DataFrame(rows), df.iloc[position + 1:]])
+    df.index = pd.MultiIndex.from_tuples(df.index)
+    return df
+
+
+def objective_sensitivities(n, case_dict):
+    """
+    Return dataframe of first-order sensitivities of the objective to the capital cost, marginal cost and
+    capacity bounds of every component, indexed by component type and name, from the solved model of network n
+    Values are converted from the numerics_scaling of the model to the units of the input file.
+    """
+    m = n.model
+    reduced_cost = reduced_costs(m)
+    cost_ranges, bound_ranges = solver_ranging(m)
+    tables = [component_sensitivities(m, n, component, cost_ranges, bound_ranges, reduced_cost) for component in CAPACITY_ATTRIBUTES]
+    df = pd.concat([table for table in tables if table is not None])
+
+    # Objective and dispatch are scaled by numerics_scaling, capacities depending on the component
+    scaling_factor = float(case_dict['numerics_scaling'])
+    scale = pd.Series(pd.concat([capacity_scaling(n, component, df.loc[component].index, scaling_factor)
+                                 for component in df.index.get_level_values(0).unique()]).to_numpy(), index=df.index)
+    df['optimal capacity'] /= scale
+    df['d objective / d capital_cost'] /= scaling_factor
+    df['d objective / d marginal_cost'] /= scaling_factor
+    for col in ['d objective / d capacity', 'd objective / d capacity min', 'd objective / d capacity max', 'capacity reduced cost']:
+        df[col] *= scale / scaling_factor
+    for col in ['capacity min range low', 'capacity min range high', 'capacity max range low', 'capacity max range high']:
+        df[col] /= scale
+    return disaggregate_sensitivities(df, n.meta.get('aggregation'), scale)
@@ -0,0 +1,149 @@
+"""
+Memory-mapped time series store
+
+A time series store is a directory <name>.tsstore with
+    meta.json     start date, column names and number of time steps
+    index.npy     hour offsets of the time steps from the start date (int32)
+    <i>.npy       one float64 array per column
+The arrays are opened memory-mapped, so that only the time steps of the requested period are read from disk.
+In the case file a store is referenced like a csv file, as 'sites.tsstore' (first column) or
+'sites.tsstore/solar' (column 'solar'), optionally with a factor, e.g. '0.5*sites.tsstore/solar'.
+"""
+import os, json, shutil, logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utilities.utilities import read_time_series_file
+
+
+STORE_EXTENSION = '.tsstore'
+STORE_VERSION = 1
+
+
+def is_time_series_reference(value):
+    """
+    Return True if an attribute value references a time series csv file or time series store
+    """
+    return isinstance(value, str) and (".csv" in value or STORE_EXTENSION in value)
+
+
+def split_store_path(path):
+    """
+    Split a store reference into (store directory, column name or None)
+    """
+    store_end = path.index(STORE_EXTENSION) + len(STORE_EXTENSION)
+    column = path[store_end:].strip('/\\')
+    return path[:store_end], column if column else None
+
+
+def is_time_series_store(path):
+    """
+    Return True if path references a time series store instead of a csv file
+    """
+    return STORE_EXTENSION in path
+
+
+def time_series_exists(path):
+    """
+    Return True if the time series csv file or store (and its column) exists
+    """
+    if not is_time_series_store(path):
+        return os.path.exists(path)
+    store_path, column = split_store_path(path)
+    if not os.path.exists(os.path.join(store_path, 'meta.json')):
+        return False
+    return column is None or column.lower() in read_store_meta(store_path)['columns']
+
+
+def read_store_meta(store_path):
+    """
+    Return the meta data of a time series store
+    """
+    with open(os.path.join(store_path, 'meta.json')) as f:
+        return json.load(f)
+
+
+def write_time_series_store(ts, store_path):
+    """
+    Write dataframe with hourly date index to a time series store, replacing an existing store
+    """
+    offsets = (ts.index - ts.index[0]) / pd.Timedelta(hours=1)
+    if not np.allclose(offsets, np.round(offsets)):
+        raise ValueError("Time series store only supports whole hour time steps")
+    if not (np.diff(offsets) > 0).all():
+        raise ValueError("Time series dates must be increasing")
+
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(store_path)), '.' + os.path.basename(store_path) + '.tmp')
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'index.npy'), np.round(offsets).astype(np.int32))
+    columns = [str(col).lower() for col in ts.columns]
+    for i, col in enumerate(ts.columns):
+        np.save(os.path.join(tmp_path, '{0}.npy'.format(i)), ts[col].to_numpy(dtype=np.float64))
+    meta = {'version': STORE_VERSION, 'start': ts.index[0].isoformat(), 'length': len(ts), 'columns': columns,
+            'created': datetime.now().isoformat(timespec='seconds')}
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+def convert_time_series_file(ts_file, store_path=None):
+    """
+    Convert a time series csv file (MEM year/month/day/hour format or datetime in first column)
+    to a time series store, by default next to the csv file. Return the path of the store.
+    """
+    if store_path is None:
+        store_path = os.path.splitext(ts_file)[0] + STORE_EXTENSION
+    ts = read_time_series_file(ts_file)
+    write_time_series_store(ts, store_path)
+    logging.info("Time series file {0} converted to store {1} with columns {2}".format(ts_file, store_path, ', '.join(ts.columns)))
+    return store_path
+
+
+def read_time_series_store(path, date_time_start=None, date_time_end=None, index_only=False):
+    """
+    Return dataframe with the time steps of a store between date_time_start and date_time_end (inclusive).
+    path: store directory, optionally followed by '/column' to return only that column
+    The values are read-only views of the memory-mapped arrays, only the requested period is read from disk.
+    """
+    store_path, column = split_store_path(path)
+    meta = read_store_meta(store_path)
+    start = pd.Timestamp(meta['start'])
+    offsets = np.load(os.path.join(store_path, 'index.npy'), mmap_mode='r')
+
+    # Positions of the requested period in the hour offsets
+    first = 0 if date_time_start is None else \
+        int(np.searchsorted(offsets, (pd.Timestamp(date_time_start) - start) / pd.Timedelta(hours=1), side='left'))
+    last = len(offsets) if date_time_end is None else \
+        int(np.searchsorted(offsets, (pd.Timestamp(date_time_end) - start) / pd.Timedelta(hours=1), side='right'))
+    index = pd.DatetimeIndex(start + pd.to_timedelta(np.asarray(offsets[first:last], dtype=np.int64), unit='h'), name='date')
+
+    if index_only:
+        return pd.DataFrame(index=index)
+    if column is not None:
+        if column.lower() not in meta['columns']:
+            raise KeyError("Column {0} not in time series store {1}".format(column, store_path))
+        columns = [column.lower()]
+    else:
+        columns = meta['columns']
+    data = {}
+    for col in columns:
+        values = np.load(os.path.join(store_path, '{0}.npy'.format(meta['columns'].index(col))), mmap_mode='r')
+        data[col] = pd.Series(values[first:last], index=index, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+
+def read_time_series(path, date_time_start=None, date_time_end=None, index_only=False):
+    """
+    Return dataframe indexed by date from a time series csv file or store, limited to the given period.
+    Only the period is read from a store, csv files are read completely.
+    """
+    if is_time_series_store(path):
+        return read_time_series_store(path, date_time_start, date_time_end, index_only)
+    ts = read_time_series_file(path, index_only)
+    return ts.loc[date_time_start: date_time_end]
@@ -105,6 +105,39 @@ def skip_until_keyword(ts_file, keyword):
             return 0  # Return 0 if the keyword is not found
 
 
+def read_time_series_file(ts_file, index_only=False):
+    """
+    Read in time series csv file and return dataframe indexed by date.
+    If index_only, only the date columns are parsed and an empty dataframe with the date index is returned.
+    """
+    skiprows = skip_until_keyword(ts_file, 'BEGIN_DATA')
+
+    usecols = None
+    if index_only:
+        header = pd.read_csv(ts_file, sep=",", skiprows=skiprows, nrows=0).columns
+        date_columns = [col for col in header if col.lower() in ['day', 'month', 'year', 'hour']]
+        usecols = date_columns if 'hour' in [col.lower() for col in date_columns] else [header[0]]
+    ts = pd.read_csv(ts_file, parse_dates=False, sep=",", skiprows=skiprows, usecols=usecols)
+    ts.columns = [x.lower() for x in ts.columns]
+    
+    # Assume first column is datetime unless 'hour' is present
+    if not 'hour' in ts.columns:
+        ts['date'] = pd.to_datetime(ts[ts.columns[0]])
+        ts.drop(columns=[ts.columns[0]], inplace=True)
+        # Drop raw demand if present
+        if 'raw demand (mw)' in ts.columns:
+            ts.drop(columns=['raw demand (mw)'], inplace=True)
+    else:
+        # Date as 'day', 'month', 'year' and 'hour' columns
+        # This corresponds to the format of the time series files from MEM (developed by CLab)
+        ts['hour'] = ts['hour'] - 1  # convert MEM 1..24 to py 0..23
+        ts['date'] = pd.to_datetime(ts[['day', 'month', 'year', 'hour']])
+        ts.drop(columns=['day', 'month', 'year', 'hour'], inplace=True)
+
+    ts.set_index('date', inplace=True)
+    return ts
+
+
 def get_output_filename(case_input_dict):
     """
     return generated output file pathname
@@ -139,19 +172,12 @@ def add_carrier_info(network, stats_df):
     """
     Add carrier information to statistics DataFrame
     """
-    # Initialize a list to hold the carrier information
+    # Look up the carrier of every (component, name) row, statistics leave out components without
+    # statistics (e.g. loads or lines), so the carriers can not be taken in the order of the components
     carriers = []
-    sorted_components = sorted(network.iterate_components(), key=lambda x: x.name)
-    # Iterate over components
-    for component_class in sorted_components:
-        if component_class.name == "Bus":
-            continue
-        # Collect carriers
-        components = getattr(network, component_class.list_name)
-        # Sort components by index
-        if hasattr(components, "carrier"):
-            sorted_carriers = components.sort_index().carrier.tolist()
-            carriers.extend(sorted_carriers)
+    for component, name in stats_df.index:
+        static = network.static(component)
+        carriers.append(static.at[name, "carrier"] if "carrier" in static.columns and name in static.index else "")
     # Add the carrier info to your statistics DataFrame
     stats_df.insert(0, "carrier", carriers)
 
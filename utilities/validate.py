@@ -0,0 +1,282 @@
+"""
+Validation of a case file in one quick pass before the PyPSA network is built
+
+All problems found in the case data, component data, time series and network topology are collected
+and reported together, so that a case fails before any modeling instead of deep inside the solver.
+"""
+import os, re, logging
+import numpy as np
+import pandas as pd
+from utilities.read_input import read_input_file_to_dict
+from utilities.utilities import is_number
+from utilities.mga import validate_mga
+from utilities.pathway import validate_pathway
+from utilities.time_series_store import is_time_series_reference, time_series_exists, read_time_series
+
+
+# Attributes for which add_buses_to_network creates a bus if it does not exist yet
+IMPLICIT_BUS_ATTRIBUTES = ['bus', 'bus1']
+# Component types that need a bus and the attributes that hold their buses
+REQUIRED_BUS_ATTRIBUTES = {'Generator': ['bus'], 'Load': ['bus'], 'StorageUnit': ['bus'], 'Store': ['bus'],
+                           'Link': ['bus0', 'bus1'], 'Line': ['bus0', 'bus1'], 'Transformer': ['bus0', 'bus1']}
+# Pairs of lower and upper capacity bounds
+CAPACITY_BOUNDS = [('p_nom_min', 'p_nom_max'), ('e_nom_min', 'e_nom_max')]
+
+
+def bus_attributes(component_dict):
+    """
+    Return the attributes of a component dictionary that hold a bus name (bus, bus0, bus1, ...)
+    """
+    return [attr for attr in component_dict if re.fullmatch(r'bus\d*', attr) and component_dict[attr] is not None]
+
+
+def time_series_references(component_dict):
+    """
+    Return list of (attribute, factor, file name) for all time series files referenced by a component,
+    parsed the same way as in dicts_to_pypsa
+    """
+    references = []
+    for attr, value in component_dict.items():
+        if is_time_series_reference(value):
+            factor = value.split("*")[0] if "*" in value else 1
+            file_name = value.split("*")[1] if "*" in value else value
+            references.append((attr, factor, file_name))
+    return references
+
+
+def validate_case_data(case_dict, problems):
+    """
+    Check the values in the case data
+    """
+    try:
+        start = pd.Timestamp(case_dict['datetime_start'])
+        end = pd.Timestamp(case_dict['datetime_end'])
+        if start >= end:
+            problems.append('datetime_start {0} is not before datetime_end {1}'.format(case_dict['datetime_start'], case_dict['datetime_end']))
+    except (ValueError, TypeError):
+        problems.append('datetime_start {0} or datetime_end {1} is not a valid date'.format(case_dict['datetime_start'], case_dict['datetime_end']))
+    if not is_number(case_dict['numerics_scaling']) or float(case_dict['numerics_scaling']) <= 0:
+        problems.append('numerics_scaling must be a positive number. Failed = {0}'.format(case_dict['numerics_scaling']))
+    if case_dict.get('delta_t') is not None and (not is_number(case_dict['delta_t']) or int(case_dict['delta_t']) < 1):
+        problems.append('delta_t must be a positive integer. Failed = {0}'.format(case_dict['delta_t']))
+    if not os.path.isdir(case_dict['input_path']):
+        problems.append('input_path {0} is not a directory'.format(case_dict['input_path']))
+
+
+def validate_time_series(case_dict, component_list, problems):
+    """
+    Check that all referenced time series files exist, can be read and cover the requested period,
+    and that they all have the same time steps within the period
+    """
+    try:
+        start = pd.Timestamp(case_dict['datetime_start'])
+        end = pd.Timestamp(case_dict['datetime_end'])
+    except (ValueError, TypeError):
+        # Invalid dates are reported by validate_case_data
+        return
+    window_lengths = {}
+    for component_dict in component_list:
+        for attr, factor, file_name in time_series_references(component_dict):
+            if not is_number(factor):
+                problems.append('Factor {0} for time series {1} of {2} is not a number'.format(factor, file_name, component_dict['name']))
+            if file_name in window_lengths:
+                continue
+            ts_file = os.path.join(case_dict['input_path'], file_name)
+            if not time_series_exists(ts_file):
+                problems.append('Time series file not found for {0} of {1} in path {2}'.format(attr, component_dict['name'], ts_file))
+                window_lengths[file_name] = None
+                continue
+            try:
+                index = read_time_series(ts_file, index_only=True).index
+            except Exception as e:
+                problems.append('Could not read time series file {0}: {1}'.format(ts_file, e))
+                window_lengths[file_name] = None
+                continue
+            if len(index) == 0:
+                problems.append('Time series file {0} is empty'.format(ts_file))
+                window_lengths[file_name] = None
+            elif start not in index or end not in index:
+                problems.append('Time series file {0} covers {1} to {2} and does not cover the requested period {3} to {4}'.format(
+                    ts_file, index.min(), index.max(), start, end))
+                window_lengths[file_name] = None
+            else:
+                window_lengths[file_name] = int(((index >= start) & (index <= end)).sum())
+
+    lengths = {length for length in window_lengths.values() if length is not None}
+    if len(lengths) > 1:
+        problems.append('Time series files have different numbers of time steps in the requested period: ' +
+                        ', '.join('{0} ({1})'.format(f, n) for f, n in window_lengths.items() if n is not None))
+
+
+def validate_topology(component_list, problems):
+    """
+    Check for duplicate names, missing buses and buses that are referenced but never created.
+    Dangling buses that only one component is connected to are valid but often a typo, they are only logged as warning.
+    """
+    names = {}
+    for component_dict in component_list:
+        key = (component_dict['component'], component_dict['name'])
+        names[key] = names.get(key, 0) + 1
+    for (component, name), count in names.items():
+        if count > 1:
+            problems.append('{0} name "{1}" is used {2} times'.format(component, name, count))
+
+    created_buses = {component_dict['name'] for component_dict in component_list if component_dict['component'] == 'Bus'}
+    for component_dict in component_list:
+        created_buses.update(component_dict[attr] for attr in IMPLICIT_BUS_ATTRIBUTES if component_dict.get(attr) is not None)
+
+    connections = {}
+    for component_dict in component_list:
+        for attr in REQUIRED_BUS_ATTRIBUTES.get(component_dict['component'], []):
+            if component_dict.get(attr) is None:
+                problems.append('{0} "{1}" has no {2}'.format(component_dict['component'], component_dict['name'], attr))
+        for attr in bus_attributes(component_dict):
+            bus = component_dict[attr]
+            connections.setdefault(bus, []).append(component_dict['name'])
+            if bus not in created_buses:
+                problems.append('Bus "{0}" ({1} of {2} "{3}") is never created, buses are only created from bus and bus1'.format(
+                    bus, attr, component_dict['component'], component_dict['name']))
+
+    for bus, connected in connections.items():
+        if len(connected) == 1:
+            logging.warning('Bus "{0}" is dangling, only "{1}" is connected to it'.format(bus, connected[0]))
+
+
+def scaled_time_series(case_dict, component_dict, attr, factor, file_name):
+    """
+    Return time series as it will be used in the model: sliced to the period, sampled every delta_t
+    and scaled as in dicts_to_pypsa, or None if it can not be read
+    """
+    try:
+        ts = read_time_series(os.path.join(case_dict['input_path'], file_name), case_dict['datetime_start'], case_dict['datetime_end'])
+        ts = ts.iloc[:, 0] * float(factor)
+    except Exception:
+        return None
+    if case_dict.get('delta_t'):
+        ts = ts.iloc[::int(case_dict['delta_t'])]
+    if 'normalization' in component_dict:
+        ts = ts * component_dict['normalization'] / ts.mean()
+    return ts * case_dict['numerics_scaling']
+
+
+def peak_load_by_bus(case_dict, component_list):
+    """
+    Return dictionary of peak total load per bus, or None for a bus where the load can not be determined
+    """
+    loads = {}
+    for component_dict in component_list:
+        if component_dict['component'] != 'Load' or component_dict.get('bus') is None:
+            continue
+        bus = component_dict['bus']
+        references = [ref for ref in time_series_references(component_dict) if ref[0] == 'p_set']
+        if references:
+            p_set = scaled_time_series(case_dict, component_dict, *references[0])
+        elif is_number(component_dict.get('p_set', 0)):
+            p_set = float(component_dict.get('p_set', 0))
+        else:
+            p_set = None
+        if p_set is None or (bus in loads and loads[bus] is None):
+            loads[bus] = None
+        else:
+            loads[bus] = loads.get(bus, 0) + (p_set.values if isinstance(p_set, pd.Series) else p_set)
+    return {bus: (float(np.max(load)) if load is not None else None) for bus, load in loads.items()}
+
+
+def max_supply_by_bus(component_list):
+    """
+    Return dictionary of the largest power that components with fixed capacities can supply to each bus.
+    Buses with an extendable or otherwise unbounded supply are infinite.
+    """
+    supply = {}
+
+    def add_supply(bus, value):
+        if bus is not None:
+            supply[bus] = supply.get(bus, 0.) + value
+
+    for component_dict in component_list:
+        component = component_dict['component']
+        fixed = 'p_nom' in component_dict and not component_dict.get('p_nom_extendable', False)
+        p_nom = float(component_dict['p_nom']) if fixed and is_number(component_dict['p_nom']) else np.inf
+        if component == 'Generator':
+            p_max_pu = component_dict.get('p_max_pu', 1.)
+            add_supply(component_dict.get('bus'), p_nom * float(p_max_pu) if is_number(p_max_pu) else np.inf)
+        elif component == 'StorageUnit':
+            add_supply(component_dict.get('bus'), p_nom)
+        elif component == 'Store':
+            # Power of a store is not limited
+            add_supply(component_dict.get('bus'), np.inf)
+        elif component == 'Link':
+            for attr in bus_attributes(component_dict):
+                if attr == 'bus0':
+                    # Link can only supply bus0 if it is bidirectional
+                    p_min_pu = component_dict.get('p_min_pu', 0.)
+                    factor = -float(p_min_pu) if is_number(p_min_pu) else np.inf
+                else:
+                    efficiency = component_dict.get('efficiency' if attr == 'bus1' else 'efficiency' + attr[3:], 1.)
+                    factor = float(efficiency) if is_number(efficiency) else np.inf
+                add_supply(component_dict[attr], p_nom * factor if factor > 0 else 0.)
+        elif component in ['Line', 'Transformer']:
+            for attr in bus_attributes(component_dict):
+                add_supply(component_dict[attr], np.inf)
+    return supply
+
+
+def validate_capacities(case_dict, component_list, problems):
+    """
+    Check capacities for negative values, inconsistent bounds and buses whose peak load exceeds
+    everything that the fixed capacities connected to them can supply
+    """
+    for component_dict in component_list:
+        for attr in ['p_nom', 'e_nom', 'p_nom_min', 'p_nom_max', 'e_nom_min', 'e_nom_max']:
+            value = component_dict.get(attr)
+            if value is not None and is_number(value) and float(value) < 0:
+                problems.append('{0} "{1}" has negative {2} = {3}'.format(component_dict['component'], component_dict['name'], attr, value))
+        for lower, upper in CAPACITY_BOUNDS:
+            if is_number(component_dict.get(lower, '')) and is_number(component_dict.get(upper, '')) and \
+                    float(component_dict[lower]) > float(component_dict[upper]):
+                problems.append('{0} "{1}" has {2} = {3} larger than {4} = {5}'.format(
+                    component_dict['component'], component_dict['name'], lower, component_dict[lower], upper, component_dict[upper]))
+
+    supply = max_supply_by_bus(component_list)
+    for bus, peak_load in peak_load_by_bus(case_dict, component_list).items():
+        if peak_load is not None and peak_load > supply.get(bus, 0.) * (1 + 1e-9):
+            problems.append('Peak load {0:.6g} on bus "{1}" exceeds the largest possible supply {2:.6g} of the fixed capacities connected to it'.format(
+                peak_load, bus, supply.get(bus, 0.)))
+
+
+def validate_inputs(case_dict, component_list, problems):
+    """
+    Run all checks on the dictionaries read from a case file and collect problems in the problems list
+    """
+    validate_case_data(case_dict, problems)
+    validate_mga(case_dict, component_list, problems)
+    validate_pathway(case_dict, problems)
+    validate_topology(component_list, problems)
+    validate_time_series(case_dict, component_list, problems)
+    validate_capacities(case_dict, component_list, problems)
+    return problems
+
+
+def check_case_file(file_name, overrides=None, cache=None):
+    """
+    Read in case file and validate it, overrides and cache are passed to read_input_file_to_dict
+    return the result of read_input_file_to_dict (None if it could not be read) and the list of problems
+    """
+    problems = []
+    inputs = read_input_file_to_dict(file_name, problems, overrides=overrides, cache=cache)
+    if inputs is not None:
+        case_dict, component_list, _ = inputs
+        validate_inputs(case_dict, component_list, problems)
+    return inputs, problems
+
+
+def report_problems(file_name, problems):
+    """
+    Log all problems found in a case file
+    """
+    for problem in problems:
+        logging.error(problem)
+    if problems:
+        logging.error('Found {0} problem(s) in case file {1}'.format(len(problems), file_name))
+    else:
+        logging.info('No problems found in case file {0}'.format(file_name))
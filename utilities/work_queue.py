@@ -0,0 +1,228 @@
+"""
+File-based work queue to run batches of cases on several machines that share a filesystem
+
+A coordinator puts one job file per case into <queue_dir>/pending. Workers on any machine claim a job by
+renaming its file to <queue_dir>/claimed, which is atomic, so that every job is run by exactly one worker.
+While a job runs, its worker touches the claimed file regularly. Jobs whose claimed file has not been touched
+for longer than the stale timeout (e.g. because the machine died) are moved back to pending by any worker.
+Finished jobs are moved to <queue_dir>/done or <queue_dir>/failed together with their status.
+"""
+import os, json, uuid, time, socket, logging, threading, multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+
+QUEUE_STATES = ['pending', 'claimed', 'done', 'failed']
+# Seconds between touches of the claimed job file of a running job
+HEARTBEAT_INTERVAL = 30
+# Seconds after which a claimed job without heartbeat is considered abandoned
+STALE_TIMEOUT = 600
+# Number of times a job is put back to pending after its worker disappeared
+MAX_ATTEMPTS = 3
+
+
+def state_dir(queue_dir, state):
+    """
+    Return the directory of a queue state and create it if necessary
+    """
+    directory = os.path.join(queue_dir, state)
+    # Workers on other machines may create the directory at the same time
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def write_job_file(path, job):
+    """
+    Write job dictionary to path atomically
+    """
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def read_job_file(path):
+    """
+    Return job dictionary from a job file
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def job_files(queue_dir, state):
+    """
+    Return sorted list of job file paths in a queue state
+    """
+    directory = state_dir(queue_dir, state)
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.json') and not f.startswith('.'))
+
+
+def enqueue_cases(queue_dir, input_files, options=None):
+    """
+    Coordinator: add one job per case file to the queue, return the list of job ids
+    options: dictionary of keyword arguments for the job function (e.g. resume, checkpoint)
+    """
+    pending = state_dir(queue_dir, 'pending')
+    job_ids = []
+    for i, input_file in enumerate(input_files):
+        case = os.path.splitext(os.path.basename(input_file))[0]
+        job_id = '{0:05d}-{1}-{2}'.format(i, case, uuid.uuid4().hex[:8])
+        job = {'job_id': job_id, 'input_file': os.path.abspath(input_file), 'options': options or {}, 'attempts': 0,
+               'enqueued': datetime.now().isoformat(timespec='seconds')}
+        write_job_file(os.path.join(pending, job_id + '.json'), job)
+        job_ids.append(job_id)
+    logging.info("Enqueued {0} case(s) in work queue {1}".format(len(job_ids), queue_dir))
+    return job_ids
+
+
+def queue_status(queue_dir):
+    """
+    Return dictionary with the number of jobs in each queue state
+    """
+    return {state: len(job_files(queue_dir, state)) for state in QUEUE_STATES}
+
+
+def claim_job(queue_dir, worker_id):
+    """
+    Claim the next pending job by renaming its file into the claimed directory.
+    Return (path of the claimed job file, job dictionary) or (None, None) if no job is pending.
+    """
+    claimed = state_dir(queue_dir, 'claimed')
+    for path in job_files(queue_dir, 'pending'):
+        claimed_path = os.path.join(claimed, os.path.basename(path))
+        try:
+            # The modification time is the heartbeat, the enqueue time would make the job stale right away
+            os.utime(path)
+            os.rename(path, claimed_path)
+            job = read_job_file(claimed_path)
+        except (FileNotFoundError, PermissionError):
+            # Another worker claimed this job first
+            continue
+        job.update(worker=worker_id, claimed=datetime.now().isoformat(timespec='seconds'))
+        write_job_file(claimed_path, job)
+        return claimed_path, job
+    return None, None
+
+
+def finish_job(queue_dir, claimed_path, job, state):
+    """
+    Move a claimed job to the done or failed state together with its updated job dictionary
+    """
+    job['finished'] = datetime.now().isoformat(timespec='seconds')
+    write_job_file(os.path.join(state_dir(queue_dir, state), os.path.basename(claimed_path)), job)
+    try:
+        os.remove(claimed_path)
+    except FileNotFoundError:
+        logging.warning("Claimed job file {0} was already removed".format(claimed_path))
+
+
+def recover_stale_jobs(queue_dir, stale_timeout=STALE_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+    """
+    Move claimed jobs whose heartbeat is older than stale_timeout back to pending,
+    or to failed if they were already attempted max_attempts times. Return the number of recovered jobs.
+    """
+    recovered = 0
+    now = time.time()
+    for path in job_files(queue_dir, 'claimed'):
+        try:
+            if now - os.path.getmtime(path) < stale_timeout:
+                continue
+            # Rename first, so that only one worker recovers the job
+            recovering_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.recover')
+            os.rename(path, recovering_path)
+        except (FileNotFoundError, PermissionError):
+            continue
+        job = read_job_file(recovering_path)
+        job['attempts'] = job.get('attempts', 0) + 1
+        logging.warning("Recovering stale job {0} of worker {1}".format(job['job_id'], job.get('worker')))
+        state = 'failed' if job['attempts'] >= max_attempts else 'pending'
+        if state == 'failed':
+            job['error'] = "Worker stopped sending heartbeats {0} times".format(job['attempts'])
+        write_job_file(os.path.join(state_dir(queue_dir, state), os.path.basename(path)), job)
+        os.remove(recovering_path)
+        recovered += 1
+    return recovered
+
+
+def heartbeat(path, stop_event, interval=HEARTBEAT_INTERVAL):
+    """
+    Touch the claimed job file every interval seconds until stop_event is set
+    """
+    while not stop_event.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def run_job(job_function, input_file, options):
+    """
+    Run job_function for one case in a worker process and return (state, result)
+    """
+    try:
+        result = job_function(input_file, **options)
+    except (Exception, SystemExit) as e:
+        # Input errors exit with sys.exit, record them as failed job instead of stopping the worker
+        return 'failed', repr(e)
+    failed = isinstance(result, dict) and result.get('status') == 'failed'
+    return ('failed' if failed else 'done'), result
+
+
+def run_worker(queue_dir, job_function, max_jobs=1, poll_interval=10, stale_timeout=STALE_TIMEOUT,
+               exit_when_empty=True, worker_id=None):
+    """
+    Worker: claim and run jobs from the queue with at most max_jobs jobs at the same time.
+    job_function(input_file, **options) is called in a separate process for every job.
+    Return when the queue has no pending or claimed jobs left (if exit_when_empty).
+    """
+    worker_id = worker_id or '{0}-{1}'.format(socket.gethostname(), os.getpid())
+    heartbeat_interval = min(HEARTBEAT_INTERVAL, stale_timeout / 4.)
+    running = {}
+    with ProcessPoolExecutor(max_workers=max_jobs) as executor:
+        while True:
+            recover_stale_jobs(queue_dir, stale_timeout)
+
+            # Claim new jobs up to the concurrency limit of this worker
+            while len(running) < max_jobs:
+                claimed_path, job = claim_job(queue_dir, worker_id)
+                if claimed_path is None:
+                    break
+                logging.info("Worker {0} running job {1}".format(worker_id, job['job_id']))
+                stop_event = threading.Event()
+                threading.Thread(target=heartbeat, args=(claimed_path, stop_event, heartbeat_interval), daemon=True).start()
+                future = executor.submit(run_job, job_function, job['input_file'], job['options'])
+                running[future] = (claimed_path, job, stop_event, time.time())
+
+            # Publish status of finished jobs
+            for future in [f for f in running if f.done()]:
+                claimed_path, job, stop_event, start_time = running.pop(future)
+                stop_event.set()
+                try:
+                    state, result = future.result()
+                except Exception as e:
+                    state, result = 'failed', repr(e)
+                job.update(result=result, wall_time=time.time() - start_time)
+                finish_job(queue_dir, claimed_path, job, state)
+                logging.info("Worker {0} finished job {1}: {2}".format(worker_id, job['job_id'], state))
+
+            if exit_when_empty and not running:
+                status = queue_status(queue_dir)
+                if status['pending'] == 0 and status['claimed'] == 0:
+                    return
+            time.sleep(poll_interval if not running else min(poll_interval, 1))
+
+
+def run_local_workers(queue_dir, job_function, n_workers=2, max_jobs=1, poll_interval=1, stale_timeout=STALE_TIMEOUT):
+    """
+    Local stand-in for several machines: run n_workers worker processes on this machine until the queue is empty.
+    Return the queue status.
+    """
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_dir, job_function),
+                                       kwargs={'max_jobs': max_jobs, 'poll_interval': poll_interval,
+                                               'stale_timeout': stale_timeout, 'worker_id': 'local-{0}'.format(i)})
+               for i in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return queue_status(queue_dir)